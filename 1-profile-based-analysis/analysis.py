@@ -1,12 +1,14 @@
 #!/usr/bin/env python3
 
-import igraph
-import pickle
 import pandas as pd
 import json
 import matplotlib.pyplot as plt
 from collections import defaultdict
 import matplotlib.ticker as ticker
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from tables import load_table
 
 ########################################### DEFINE LISTS OF VERSION NUMBERS, FORENSICS STRUCTURES ETC
 lnx_tags = [["2.6.x", 0, 47], ["3.x", 47, 179], ["4.x", 179, 365], ["5.x", 365, 472], ["6.x", 472, None]]
@@ -148,129 +150,72 @@ forensics_structs = [set(forensics_sf[0].keys()), set(forensics_sf[1].keys()), s
 
 ####################################################################################
 
-# Load datasets
-print("Loading datasets...")
-dataset = []
-for kidx, k in enumerate(["lnx", "xnu", "win"]):
-    dataset.append({})
-    with open(f"./ptrs_graph_{k}", "rb") as f:
-        dataset[-1]["gp"] = pickle.load(f)
-
-    dataset[-1]["stats"] = pd.read_csv(f"./stats_{k}", sep="|",dtype={'major': str, 'minor': str, 'build': str})
-    dataset[-1]["changes"] = pd.read_csv(f"./changes_{k}", sep="|",dtype={'major': str, 'minor': str, 'build': str})
-
-    with open(f"./fields_{k}.json", "rb") as f:
-        dataset[-1]["fields"] = json.load(f)
-
-############################################ Print some simple statistics (Table 1)
-print("\n")
-
-total_fields = 0
-total_versions = 0
-for i in range(3):
-    print(f"########## {os_names[i]} (Table 1) ############")
-
-    l = int(dataset[i]["stats"]["vidx"].iloc[-1]) + 1
-    total_versions += l
-    print(f"Number of versions: {l}")
-    
-    
-    m = ".".join(dataset[i]["stats"].iloc(0)[0][["major", "minor", "build"]].to_string(header=False, index=False).split('\n'))
-    M = ".".join(dataset[i]["stats"].tail(1)[["major", "minor", "build"]].to_string(header=False, index=False).split('\n'))
-    print(f"Minimum kernel version {m}")
-    print(f"Maximum kernel version {M}")
-    print(f"Number of forensics structs {len(forensics_structs[i])}")
-    for k in forensics_sf[i].values():
-        total_fields += len(k)
-
-    # Percentage of versions without changes
-    d = dataset[i]["changes"]
-    changed_versions = len(set(d["vidx"]))
-
-    filt = [(x, y) for x,v in forensics_sf[i].items() for y in v ]
-    d = d[d[["s_name","f_name"]].apply(tuple, 1).isin(filt)]
-    d = d[d["property"] == "f_offset"]
-
-    changed_versions_forensics = len(set(d["vidx"]))
-    print(f"Changed versions (percentage): {changed_versions/l * 100}")
-    print(f"Changed versions due to offset shift (percentage): {changed_versions_forensics/l * 100}")    
+def stats_lookup(d, frame, column="size", offset=-1):
+    # Value of a stats column for the struct of each row of frame, offset versions away (NaN if the struct is missing there).
+    # The stats are indexed by (vidx, s_name) once per dataset and joined with all the rows at once
+    if "stats_idx" not in d:
+        d["stats_idx"] = d["stats"].drop_duplicates(["vidx", "s_name"]).set_index(["vidx", "s_name"]).sort_index()
+    keys = pd.MultiIndex.from_arrays([frame["vidx"].astype("int64") + offset, frame["s_name"]])
+    return pd.Series(d["stats_idx"][column].reindex(keys).to_numpy(), index=frame.index)
+
+def build_cube(d, f_structs):
+    # Count the changes once per (vidx, s_name, f_name, kind, difference, property, forensic) and derive from the counts
+    # the per-version/per-struct and the per-field cubes, figures and tables slice them instead of scanning the raw tables
+    keys = ["vidx", "s_name", "f_name", "kind", "difference", "property"]
+    counts = d["changes"][keys].assign(forensic=d["forensic_mask"].to_numpy()).groupby(keys + ["forensic"], dropna=False).size().rename("n").reset_index()
+    structs = d["stats"][["vidx", "s_name"]].drop_duplicates()
+    return {
+        "versions": counts.groupby(["vidx", "s_name", "kind", "difference", "property", "forensic"], dropna=False)["n"].sum().reset_index(),
+        "fields": counts.groupby(["s_name", "f_name", "kind", "difference", "property", "forensic"], dropna=False)["n"].sum().reset_index(),
+        "structs": structs.groupby("vidx").size(), # Number of structs per version
+        "forensic_structs": structs[structs["s_name"].isin(f_structs)].groupby("vidx").size() # Forensics structs per version (some of them are not present in early kernel releases)
+    }
 
-print("\n")
-print(f"Total forensics fields: {total_fields}")
-print(f"Total versions: {total_versions}")
+def load_dataset(kidx, k):
+    d = {}
+    d["graph_summary"] = load_table(f"./graph_summary_{k}")
 
+    d["stats"] = load_table(f"./stats_{k}")
+    d["changes"] = load_table(f"./changes_{k}")
 
-############################################## Figure 1
-print("Plotting Figure 1... (output as PDF file)")
-fig, axs = plt.subplots(1, 3, figsize=(15, 5))
+    # Changes of the forensics (struct, field) pairs
+    forensic_pairs = pd.MultiIndex.from_tuples([(x, y) for x, v in forensics_sf[kidx].items() for y in v])
+    changes_pairs = pd.MultiIndex.from_frame(d["changes"][["s_name", "f_name"]])
+    d["forensic_mask"] = pd.Series(changes_pairs.isin(forensic_pairs), index=d["changes"].index)
 
-num_dtype = [] # Number of data types
-for idx, profiles in enumerate(dataset):
-    num_dtype.append([])
-    for graph in profiles["gp"]:
-        num_dtype[-1].append(len(graph.vs))
+    d["cube"] = build_cube(d, forensics_structs[kidx])
 
-    axs[idx].plot(num_dtype[-1], ".", markersize=3)
+    with open(f"./fields_{k}.json", "rb") as f:
+        d["fields"] = json.load(f)
+    return d
 
-    axs[idx].set_xlim(0, len(num_dtype[-1]))
-    axs[idx].set_title(os_names[idx])
+def analyze(kidx):
+    # Load the dataset of an OS and run the computations of every section on it. With -j each OS is analyzed
+    # in its own process: the tables never leave it, only the results used for printing and plotting are sent back
+    d = load_dataset(kidx, ["lnx", "xnu", "win"][kidx])
+    results = {}
 
-    axs[idx].set_title(os_names[idx])
-    for i in tags[idx]:
-        if i[2] is None:
-            continue
-        axs[idx].axvline(x=i[2], color='red', linestyle='--', alpha=0.5)
-        axs[idx].set_xticks(list(zip(*tags[idx]))[1])
-        axs[idx].set_xticklabels(list(zip(*tags[idx]))[0], rotation=90)
+    ############################################ Table 1
+    results["versions"] = int(d["stats"]["vidx"].iloc[-1]) + 1
+    results["min_version"] = ".".join(d["stats"].iloc(0)[0][["major", "minor", "build"]].to_string(header=False, index=False).split('\n'))
+    results["max_version"] = ".".join(d["stats"].tail(1)[["major", "minor", "build"]].to_string(header=False, index=False).split('\n'))
 
-    d = dataset[idx]["changes"]
-    
-    all_mods = d.groupby(["vidx", "s_name"]).first().reset_index().groupby("vidx").count().reset_index()  # All versions with at least a structure modified per vidx
-    total_structs = dataset[idx]["stats"].groupby(["vidx", "s_name"]).first().reset_index().groupby("vidx").count().reset_index() # All structures per vidx
-    merged_df = pd.merge(all_mods[["vidx", "major"]], total_structs[["vidx", "minor"]], on='vidx')
-    all_mods['percentage_changed'] = merged_df['major'] / merged_df['minor'] * 100
+    # Percentage of versions without changes
+    v = d["cube"]["versions"]
+    results["changed_versions"] = v["vidx"].nunique()
+    results["changed_versions_forensics"] = v.loc[v["forensic"] & (v["property"] == "f_offset"), "vidx"].nunique()
 
-    ax2 = axs[idx].twinx()
-    ax2.scatter(all_mods["vidx"], all_mods["percentage_changed"], marker="x", s=40, color="green")
-    
-    ax2.set_ylim(0, 50)
-    ax2.set_yticks(range(0,51,5))
-   
-    tags_vidx = [x[2] for x in tags[idx] if x[2] is not None]
+    ############################################ Figure 1
+    summary = d["graph_summary"]
+    results["num_dtype"] = summary[summary["graph"] == "pointers"].sort_values("vidx")["nodes"].tolist() # Number of data types
 
-    for i in tags[idx]:
-        if i[2] is None:
-            continue
-        ax2.axvline(x=i[2], color='black', linestyle='--', alpha=0.5)
+    cube = d["cube"]
+    changed = cube["versions"].groupby("vidx")["s_name"].nunique() # Structures modified per vidx, for all versions with at least one
+    results["all_mods"] = (changed / cube["structs"].loc[changed.index] * 100).rename("percentage_changed").reset_index()
 
-    axs[0].set_ylabel('Number of data types')
-    
-    # Plot ticks
-    if idx < 2:
-        ax2.set_xticks(list(zip(*tags[idx]))[1])
-        ax2.set_xticklabels(list(zip(*tags[idx]))[0], rotation=90)
-    else:  
-        tags_vidx.extend([x[1] for x in win_minors if x[1] is not None])
-        for i in win_minors:
-            if i[1] is None:
-                continue
-            ax2.axvline(x=i[1], color='grey', linestyle='--', alpha=0.3)
-        
-        ax2.set_xticklabels(list(list(zip(*tags[idx]))[0]), rotation=90)
-        ticks = list(zip(*tags[idx]))[1] + list(zip(*win_minors))[1]
-        ax2.set_xticks(ticks)
-        ax2.set_ylabel('Percentage of data types changed')
-
-plt.tight_layout()
-plt.savefig("figure1.pdf")
-
-############################################################## Table 2
-print("\n")
-matrix = []
-tchange = ["added", "removed", "kind", "type", "size", "offset"]
-kinds = ["base", "pointer", "array", "bitfield", "struct", "union"]
-for idx in  range(0,3):
-    print(f"########## {os_names[idx]} (Table 2) ############")
+    ############################################ Table 2
+    tchange = ["added", "removed", "kind", "type", "size", "offset"]
+    kinds = ["base", "pointer", "array", "bitfield", "struct", "union"]
     columns = {
         "added" : defaultdict(int),
         "removed" : defaultdict(int),
@@ -279,57 +224,32 @@ for idx in  range(0,3):
         "size" : defaultdict(int),
         "kind" : defaultdict(int)
     }
-    
-    c = dataset[idx]["changes"]
+
+    c = d["cube"]["fields"]
     c = c[(c["kind"] == "field")]
-    
-    print(f"Total number of changes {len(c)}")
-    
-    c = c[(c["s_name"].isin(forensics_structs[idx]))]
-    filt = [(x, y) for x,v in forensics_sf[idx].items() for y in v ]
-    c = c[c[["s_name","f_name"]].apply(tuple, 1).isin(filt)]
-    
-    cc = c[(c["difference"] == "change")]
-    print(f"Total number of changes in forensic fields {len(c)}")
+    results["total_changes"] = c["n"].sum()
+
+    c = c[c["forensic"]]
+    changed = c["difference"] == "change"
+    results["total_changes_forensics"] = c["n"].sum()
 
     # Collect different types of changes for each kind
-    df = dataset[idx]["fields"]
-    for _, row  in c[(c["difference"] == "added")][["s_name","f_name"]].groupby(["s_name","f_name"]).size().reset_index().iterrows():
-        try:
-            columns["added"][df[row["s_name"]][row["f_name"]]] += row[0]
-        except KeyError:
-            continue
-
-    for _, row  in c[(c["difference"] == "removed")][["s_name","f_name"]].groupby(["s_name","f_name"]).size().reset_index().iterrows():
-        try:
-            columns["removed"][df[row["s_name"]][row["f_name"]]] += row[0]
-        except KeyError:
-            continue
-
-    for _, row  in cc[(cc["property"] == "f_offset")][["s_name","f_name"]].groupby(["s_name","f_name"]).size().reset_index().iterrows():
-        try:
-            columns["offset"][df[row["s_name"]][row["f_name"]]] += row[0]
-        except KeyError:
-            continue
-
-    for _, row  in cc[(cc["property"] == "f_type")][["s_name","f_name"]].groupby(["s_name","f_name"]).size().reset_index().iterrows():
-        try:
-            columns["type"][df[row["s_name"]][row["f_name"]]] += row[0]
-        except KeyError:
-            continue
-
-    for _, row  in cc[(cc["property"] == "f_size")][["s_name","f_name"]].groupby(["s_name","f_name"]).size().reset_index().iterrows():
-        try:
-            columns["size"][df[row["s_name"]][row["f_name"]]] += row[0]
-        except KeyError:
-            continue
-
-    for _, row  in cc[(cc["property"] == "f_kind")][["s_name","f_name"]].groupby(["s_name","f_name"]).size().reset_index().iterrows():
-        try:
-            columns["kind"][df[row["s_name"]][row["f_name"]]] += row[0]
-        except KeyError:
-            continue
-    
+    df = d["fields"]
+    selections = {
+        "added": c["difference"] == "added",
+        "removed": c["difference"] == "removed",
+        "offset": changed & (c["property"] == "f_offset"),
+        "type": changed & (c["property"] == "f_type"),
+        "size": changed & (c["property"] == "f_size"),
+        "kind": changed & (c["property"] == "f_kind")
+    }
+    for column, selection in selections.items():
+        for (s_name, f_name), count in c[selection].groupby(["s_name","f_name"])["n"].sum().items():
+            try:
+                columns[column][df[s_name][f_name]] += count
+            except KeyError:
+                continue
+
     # Reorganize data to be put in a Dataframe
     res = {}
     for c in tchange:
@@ -339,17 +259,17 @@ for idx in  range(0,3):
                 res[c].append(columns[c][r])
             except:
                 res[c].append(0)
-    matrix.append(pd.DataFrame(res))
+    matrix = pd.DataFrame(res)
 
     # Get percentages and round up
-    matrix[-1] = matrix[-1] / (matrix[-1].sum().sum()) * 100
-    matrix[-1]["field_kind"] = kinds
-    m = matrix[-1].round(2)
+    matrix = matrix / (matrix.sum().sum()) * 100
+    matrix["field_kind"] = kinds
+    m = matrix.round(2)
 
     m = m[["field_kind", "added", "removed", "kind", "type", "size", "offset"]]
-    
+
     # Create the Total row
-    new_row = ["Total", 
+    new_row = ["Total",
                m.loc[[0,1,4]]["added"].sum(),
                m.loc[[0,1,4]]["removed"].sum(),
                m.loc[[0,1,4]]["kind"].sum(),
@@ -363,120 +283,221 @@ for idx in  range(0,3):
     # Get only rows and columns to be printed
     m = m.loc[[0,1,4,6]]
     m = m[["field_kind", "added", "removed", "properties", "offset"]]
-    
-    print(m.to_latex())
-
-
-############################################################## Section 3.2.1
-print("\n")
+    results["table2"] = m.to_latex()
 
-matrix_adds = []
-matrix_change = []
-for idx in  range(0,3):
-    c = dataset[idx]["changes"]
-    c = c[(c["s_name"].isin(forensics_structs[idx])) & (c["kind"] == "field") & (c["difference"] == "added")]
+    ############################################ Section 3.2.1
+    c = d["changes"]
+    c = c[(c["s_name"].isin(forensics_structs[kidx])) & (c["kind"] == "field") & (c["difference"] == "added")]
 
-    s = dataset[idx]["stats"]
-    s = s[s["s_name"].isin(forensics_structs[idx])]
-    
     # To calculate how many fields are NOT added at the end of a structure we calculate the percentage of fields inserted in the structure at version change
     total = len(c)
-    count = 0
-    for _, row in c.iterrows():
-        try:
-            old_size = s[(s["vidx"] == int(row["vidx"])-1) & (s["s_name"] == row["s_name"])]["size"].iloc[0]
-        except Exception as e:
-            continue
-        new_offset =  row["new_val"]
-        count += int(int(new_offset) < old_size)
+    old_size = stats_lookup(d, c) # Size of the structure in the previous version
+    found = old_size.notna()
+    count = int((c["new_val"][found].astype("int64") < old_size[found]).sum())
+    results["adds"] = count/total * 100
+
+    ############################################ Figure 2
+    d_f = cube["versions"]
+    d_f = d_f[d_f["forensic"] & (d_f["kind"] == "field") & (d_f["property"] == "f_offset")]
+
+    changed = d_f.groupby("vidx")["s_name"].nunique() # Forensics modified types per version
+    results["forensic_mods"] = (changed / cube["forensic_structs"].loc[changed.index] * 100).rename("percentage_changed").reset_index()
+    results["max_vidx"] = d["stats"]["vidx"].max()
+
+    ############################################ Table 3 and Table 4
+    d_f = cube["fields"]
+    d_f = d_f[d_f["forensic"] & (d_f["property"] == "f_offset")]
+
+    k = d_f.groupby(["s_name","f_name"])["n"].sum().reset_index(name=0) # Count the total number of modification by structure and field
+    results["table3"] = k[["s_name", 0]].groupby("s_name").sum().reset_index().sort_values(0, ascending=False).head(5).to_latex() # Collect by type name
+    results["table4"] = k.sort_values([0, "s_name"], ascending=False).head(10).to_latex()
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-j', type=int, default=1, help='Number of processes, each one analyzes an OS')
+    args = parser.parse_args()
+
+    # Load datasets
+    print("Loading datasets...")
+    if args.j > 1:
+        with ProcessPoolExecutor(max_workers=min(args.j, len(os_names))) as pool:
+            dataset = list(pool.map(analyze, range(len(os_names))))
+    else:
+        dataset = [analyze(kidx) for kidx in range(len(os_names))]
+
+    ############################################ Print some simple statistics (Table 1)
+    print("\n")
 
-    matrix_adds.append(count/total * 100)
-    print(f"########## {os_names[idx]} (Section 3.2.1) Percentage of fields added between other fields {matrix_adds[-1]}" )
+    total_fields = 0
+    total_versions = 0
+    for i in range(3):
+        print(f"########## {os_names[i]} (Table 1) ############")
 
+        l = dataset[i]["versions"]
+        total_versions += l
+        print(f"Number of versions: {l}")
 
 
-#################################################################### Figure 2
-fig, axs = plt.subplots(1, 3, figsize=(15, 5))
-print("\n")
-print("Plotting Figure 2... (output as PDF file)")
+        print(f"Minimum kernel version {dataset[i]['min_version']}")
+        print(f"Maximum kernel version {dataset[i]['max_version']}")
+        print(f"Number of forensics structs {len(forensics_structs[i])}")
+        for k in forensics_sf[i].values():
+            total_fields += len(k)
 
-for idx, i in enumerate(dataset):
+        # Percentage of versions without changes
+        print(f"Changed versions (percentage): {dataset[i]['changed_versions']/l * 100}")
+        print(f"Changed versions due to offset shift (percentage): {dataset[i]['changed_versions_forensics']/l * 100}")
 
-    d = dataset[idx]["changes"]
-    d = d[(d["s_name"].isin(forensics_structs[idx])) & (d["kind"] == "field") & (d["property"] == "f_offset")]
-    filt = [(x, y) for x,v in forensics_sf[idx].items() for y in v]
-    d = d[d[["s_name","f_name"]].apply(tuple, 1).isin(filt)]
-    
-    all_mods = d.groupby(["vidx", "s_name"]).first().reset_index().groupby("vidx").count().reset_index() # Forensics modified types per version
-    total_structs = dataset[idx]["stats"][dataset[idx]["stats"]["s_name"].isin(forensics_structs[idx])].groupby(["vidx", "s_name"]).first().reset_index().groupby("vidx").count().reset_index() # Total number of forensics type per version (some of them are not present in early kernel releases)
-    merged_df = pd.merge(all_mods[["vidx", "major"]], total_structs[["vidx", "minor"]], on='vidx')
-    all_mods['percentage_changed'] = merged_df['major'] / merged_df['minor'] * 100
-
-    # Divide them in major, minor, patches
-    majors_v = all_mods[all_mods["vidx"].isin(list(zip(*tags[idx]))[1])]
-    minors_v = all_mods[all_mods["vidx"].isin(list(zip(*minors[idx]))[1]) & (~all_mods["vidx"].isin(list(zip(*tags[idx]))[1]))]
-    patches_v = all_mods[(~all_mods["vidx"].isin(list(zip(*minors[idx]))[1])) & (~all_mods["vidx"].isin(list(zip(*tags[idx]))[1]))]
-
-    # Print numeric percentage percentage
-    total = majors_v["percentage_changed"].sum() + minors_v["percentage_changed"].sum() + patches_v["percentage_changed"].sum()
-    print(f'######## Section 3.2.2 {os_names[idx]}: Percentage of changes in major releases {majors_v["percentage_changed"].sum() / total * 100}')
-    print(f'######## Section 3.2.2 {os_names[idx]}: Percentage of changes in minor releases {minors_v["percentage_changed"].sum() / total * 100}')
-    print(f'######## Section 3.2.2 {os_names[idx]}: Percentage of changes in patch releases {patches_v["percentage_changed"].sum() / total * 100}')
     print("\n")
-    
-    # Plot them
-    axs[idx].scatter(patches_v["vidx"], patches_v["percentage_changed"], marker=".", s=40, color="red")
-    axs[idx].scatter(minors_v["vidx"], minors_v["percentage_changed"], marker="^", s=40, color="green")
-    axs[idx].scatter(majors_v["vidx"], majors_v["percentage_changed"], marker="x", s=60)
-
-    axs[idx].set_title(os_names[idx])
-    axs[idx].set_ylim(0, 40)
-    axs[idx].set_xlim(0,  dataset[idx]["stats"]["vidx"].max())
-    axs[idx].set_yticks(range(0,41,5))
-   
-    tags_vidx = [x[2] for x in tags[idx] if x[2] is not None]
-    axs[idx].yaxis.set_major_formatter(ticker.FuncFormatter(lambda y, _: '{:g}'.format(y)))
-
-    # Plot ticks
-    for i in tags[idx]:
-        if i[2] is None:
-            continue
-        axs[idx].axvline(x=i[2], color='black', linestyle='--', alpha=0.5)
-    if idx < 2:
-        axs[idx].set_xticks(list(zip(*tags[idx]))[1])
-        axs[idx].set_xticklabels(list(zip(*tags[idx]))[0], rotation=90)
-    else:  
-        tags_vidx.extend([x[1] for x in win_minors if x[1] is not None])
-        for i in win_minors:
-            if i[1] is None:
+    print(f"Total forensics fields: {total_fields}")
+    print(f"Total versions: {total_versions}")
+
+
+    ############################################## Figure 1
+    print("Plotting Figure 1... (output as PDF file)")
+    fig, axs = plt.subplots(1, 3, figsize=(15, 5))
+
+    num_dtype = [] # Number of data types
+    for idx, profiles in enumerate(dataset):
+        num_dtype.append(profiles["num_dtype"])
+
+        axs[idx].plot(num_dtype[-1], ".", markersize=3)
+
+        axs[idx].set_xlim(0, len(num_dtype[-1]))
+        axs[idx].set_title(os_names[idx])
+
+        axs[idx].set_title(os_names[idx])
+        for i in tags[idx]:
+            if i[2] is None:
                 continue
-            axs[idx].axvline(x=i[1], color='grey', linestyle='--', alpha=0.3)
-
-        ticks = list(zip(*tags[idx]))[1]
-        axs[idx].set_xticks(ticks)
-        axs[idx].set_xticklabels(list(zip(*tags[idx]))[0], rotation=90)
-       
-axs[0].set_ylabel("Percentage of forensics data types modified")
-
-plt.tight_layout()
-plt.savefig("figure2.pdf")
-
-##################################################################### Table 3 and Table 4
-print("\n")
-for idx, i in enumerate(dataset):
-    d = dataset[idx]["changes"]
-    d = d[(d["s_name"].isin(forensics_structs[idx])) & (d["property"] == "f_offset")]
-    filt = [(x, y) for x,v in forensics_sf[idx].items() for y in v ]
-    d = d[d[["s_name","f_name"]].apply(tuple, 1).isin(filt)]
-
-    k = d[["s_name","f_name"]].groupby(["s_name","f_name"]).size().reset_index() # Count the total number of modification by structure and field
-    print(f"######### Table 3 {os_names[idx]} #########")
-    t3 = k[["s_name", 0]].groupby("s_name").sum().reset_index().sort_values(0, ascending=False).head(5).to_latex() # Collect by type name
-    print(t3)
+            axs[idx].axvline(x=i[2], color='red', linestyle='--', alpha=0.5)
+            axs[idx].set_xticks(list(zip(*tags[idx]))[1])
+            axs[idx].set_xticklabels(list(zip(*tags[idx]))[0], rotation=90)
+
+        all_mods = profiles["all_mods"]
+
+        ax2 = axs[idx].twinx()
+        ax2.scatter(all_mods["vidx"], all_mods["percentage_changed"], marker="x", s=40, color="green")
+
+        ax2.set_ylim(0, 50)
+        ax2.set_yticks(range(0,51,5))
+
+        tags_vidx = [x[2] for x in tags[idx] if x[2] is not None]
+
+        for i in tags[idx]:
+            if i[2] is None:
+                continue
+            ax2.axvline(x=i[2], color='black', linestyle='--', alpha=0.5)
+
+        axs[0].set_ylabel('Number of data types')
+
+        # Plot ticks
+        if idx < 2:
+            ax2.set_xticks(list(zip(*tags[idx]))[1])
+            ax2.set_xticklabels(list(zip(*tags[idx]))[0], rotation=90)
+        else:
+            tags_vidx.extend([x[1] for x in win_minors if x[1] is not None])
+            for i in win_minors:
+                if i[1] is None:
+                    continue
+                ax2.axvline(x=i[1], color='grey', linestyle='--', alpha=0.3)
+
+            ax2.set_xticklabels(list(list(zip(*tags[idx]))[0]), rotation=90)
+            ticks = list(zip(*tags[idx]))[1] + list(zip(*win_minors))[1]
+            ax2.set_xticks(ticks)
+            ax2.set_ylabel('Percentage of data types changed')
+
+    plt.tight_layout()
+    plt.savefig("figure1.pdf")
+
+    ############################################################## Table 2
     print("\n")
+    for idx in  range(0,3):
+        print(f"########## {os_names[idx]} (Table 2) ############")
+        print(f"Total number of changes {dataset[idx]['total_changes']}")
+        print(f"Total number of changes in forensic fields {dataset[idx]['total_changes_forensics']}")
+        print(dataset[idx]["table2"])
 
-    print(f"######### Table 4 {os_names[idx]} #########")
-    t4 = k.sort_values([0, "s_name"], ascending=False).head(10).to_latex()
-    print(t4)
 
-    
+    ############################################################## Section 3.2.1
+    print("\n")
+
+    matrix_adds = []
+    for idx in  range(0,3):
+        matrix_adds.append(dataset[idx]["adds"])
+        print(f"########## {os_names[idx]} (Section 3.2.1) Percentage of fields added between other fields {matrix_adds[-1]}" )
+
+
+
+    #################################################################### Figure 2
+    fig, axs = plt.subplots(1, 3, figsize=(15, 5))
+    print("\n")
+    print("Plotting Figure 2... (output as PDF file)")
+
+    for idx, i in enumerate(dataset):
+
+        all_mods = dataset[idx]["forensic_mods"]
+
+        # Divide them in major, minor, patches
+        majors_v = all_mods[all_mods["vidx"].isin(list(zip(*tags[idx]))[1])]
+        minors_v = all_mods[all_mods["vidx"].isin(list(zip(*minors[idx]))[1]) & (~all_mods["vidx"].isin(list(zip(*tags[idx]))[1]))]
+        patches_v = all_mods[(~all_mods["vidx"].isin(list(zip(*minors[idx]))[1])) & (~all_mods["vidx"].isin(list(zip(*tags[idx]))[1]))]
+
+        # Print numeric percentage percentage
+        total = majors_v["percentage_changed"].sum() + minors_v["percentage_changed"].sum() + patches_v["percentage_changed"].sum()
+        print(f'######## Section 3.2.2 {os_names[idx]}: Percentage of changes in major releases {majors_v["percentage_changed"].sum() / total * 100}')
+        print(f'######## Section 3.2.2 {os_names[idx]}: Percentage of changes in minor releases {minors_v["percentage_changed"].sum() / total * 100}')
+        print(f'######## Section 3.2.2 {os_names[idx]}: Percentage of changes in patch releases {patches_v["percentage_changed"].sum() / total * 100}')
+        print("\n")
+
+        # Plot them
+        axs[idx].scatter(patches_v["vidx"], patches_v["percentage_changed"], marker=".", s=40, color="red")
+        axs[idx].scatter(minors_v["vidx"], minors_v["percentage_changed"], marker="^", s=40, color="green")
+        axs[idx].scatter(majors_v["vidx"], majors_v["percentage_changed"], marker="x", s=60)
+
+        axs[idx].set_title(os_names[idx])
+        axs[idx].set_ylim(0, 40)
+        axs[idx].set_xlim(0,  dataset[idx]["max_vidx"])
+        axs[idx].set_yticks(range(0,41,5))
+
+        tags_vidx = [x[2] for x in tags[idx] if x[2] is not None]
+        axs[idx].yaxis.set_major_formatter(ticker.FuncFormatter(lambda y, _: '{:g}'.format(y)))
+
+        # Plot ticks
+        for i in tags[idx]:
+            if i[2] is None:
+                continue
+            axs[idx].axvline(x=i[2], color='black', linestyle='--', alpha=0.5)
+        if idx < 2:
+            axs[idx].set_xticks(list(zip(*tags[idx]))[1])
+            axs[idx].set_xticklabels(list(zip(*tags[idx]))[0], rotation=90)
+        else:
+            tags_vidx.extend([x[1] for x in win_minors if x[1] is not None])
+            for i in win_minors:
+                if i[1] is None:
+                    continue
+                axs[idx].axvline(x=i[1], color='grey', linestyle='--', alpha=0.3)
+
+            ticks = list(zip(*tags[idx]))[1]
+            axs[idx].set_xticks(ticks)
+            axs[idx].set_xticklabels(list(zip(*tags[idx]))[0], rotation=90)
+
+    axs[0].set_ylabel("Percentage of forensics data types modified")
+
+    plt.tight_layout()
+    plt.savefig("figure2.pdf")
+
+    ##################################################################### Table 3 and Table 4
+    print("\n")
+    for idx, i in enumerate(dataset):
+        print(f"######### Table 3 {os_names[idx]} #########")
+        print(dataset[idx]["table3"])
+        print("\n")
+
+        print(f"######### Table 4 {os_names[idx]} #########")
+        print(dataset[idx]["table4"])
+
+if __name__ == "__main__":
+    main()
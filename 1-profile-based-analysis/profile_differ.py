@@ -5,26 +5,140 @@ import pickle
 from dictdiffer import diff as ddiff
 import os
 import lzma
+import re
+import sys
+import gc
+import hashlib
 from tqdm import tqdm
 from collections import defaultdict
 import argparse
 import igraph as ig
+import numpy as np
 from copy import deepcopy
+from collections import deque, OrderedDict
+from contextlib import nullcontext
+from itertools import islice
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from tables import CHANGES_COLUMNS, BASELINE_CHANGES_COLUMNS, STATS_COLUMNS, GRAPH_SUMMARY_COLUMNS, CSVTable, ParquetTable, GraphStoreWriter, SymbolDeltaWriter, FieldLifetimeWriter, ImpactWriter
 
 from IPython import embed
 
 ANONYMOUS_PREFIXES = ("unnamed_", "__anonymous_", "$_")
+FLATTEN_VERSION = 3 # Bump it every time the flattening changes to invalidate the cached profiles
+SCAN_THREADS = 16 # Threads used to stat the dataset files
+JSON_OBJECT_START = re.compile(r'[ \t\n\r]*(\{)?')
+JSON_MEMBER_KEY = re.compile(r'[ \t\n\r]*(?:(\})|"((?:[^"\\]|\\.)*)"[ \t\n\r]*:[ \t\n\r]*)')
+JSON_MEMBER_END = re.compile(r'[ \t\n\r]*([,}])')
+JSON_NUMBER_CHARS = "0123456789+-.eE"
+
+def iter_profile_entries(file_path, chunk_size=1 << 22):
+    # Yield (section, name, value) for each entry of the top level sections of an ISF profile
+    # (user_types, base_types, symbols...) without materializing the whole decompressed document.
+    # Top level values that are not objects are yielded as (section, None, value)
+    decoder = json.JSONDecoder()
+    with lzma.open(file_path, "rt") as f:
+        buf = ""
+        pos = 0
+        eof = False
+
+        def fill():
+            nonlocal buf, pos, eof
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+                return
+            buf = buf[pos:] + chunk
+            pos = 0
+
+        def match(pattern):
+            nonlocal pos
+            while True:
+                m = pattern.match(buf, pos)
+                # A match reaching the end of the buffer could continue in the next chunk
+                if m and (m.end() < len(buf) or eof):
+                    pos = m.end()
+                    return m
+                if eof:
+                    raise ValueError(f"Malformed profile {file_path} at {pos}")
+                fill()
+
+        def decode():
+            nonlocal pos
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                    # A number followed by the end of the buffer could be truncated
+                    if eof or (end < len(buf) and buf[end] not in JSON_NUMBER_CHARS):
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                fill()
+
+        def members():
+            m = match(JSON_MEMBER_KEY)
+            while not m.group(1):
+                key = m.group(2)
+                yield key if "\\" not in key else json.loads(f'"{key}"')
+                if match(JSON_MEMBER_END).group(1) == "}":
+                    return
+                m = match(JSON_MEMBER_KEY)
+
+        if not match(JSON_OBJECT_START).group(1):
+            raise ValueError(f"Malformed profile {file_path}: not a JSON object")
+
+        for section in members():
+            if not match(JSON_OBJECT_START).group(1):
+                yield section, None, decode()
+                continue
+            for name in members():
+                yield section, name, decode()
+
+def profile_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+@lru_cache(maxsize=None)
+def is_anonymous(type_name):
+    # Type names repeat over all the fields and profiles, the prefixes are searched once per name
+    return any(anon_prefix in type_name for anon_prefix in ANONYMOUS_PREFIXES)
+
+class Field:
+    # Flattened field. Kinds, types and names are interned: the same strings repeat over thousands of
+    # fields and over all the loaded profiles. Missing metadata (base_kind, total_size) are None
+    __slots__ = ("offset", "kind", "base_type", "base_kind", "total_size")
+
+    def __init__(self, offset, kind, base_type, base_kind=None, total_size=None):
+        self.offset = offset
+        self.kind = sys.intern(kind)
+        self.base_type = sys.intern(base_type)
+        self.base_kind = sys.intern(base_kind) if base_kind is not None else None
+        self.total_size = total_size
+
+    def moved(self, offset):
+        # Same field placed offset bytes after
+        if offset == 0:
+            return self
+        return Field(self.offset + offset, self.kind, self.base_type, self.base_kind, self.total_size)
+
+    def __reduce__(self):
+        # Strings are interned again when unpickled (cache and worker processes)
+        return Field, (self.offset, self.kind, self.base_type, self.base_kind, self.total_size)
 
 class OS:
-    def __init__(self, file_path, version_idx=0):
-        data = json.loads(lzma.open(file_path).read())
-        
+    # Common structs compared by the python diff engine, and the ones skipped because their hashes are equal
+    structs_compared = 0
+    structs_skipped = 0
+
+    def __init__(self, file_path, version_idx=0, cache_dir=None):
         self.version_idx = version_idx
         
-        self.raw_structs = data["user_types"]
-        self.types = data["base_types"]
-        self.symbols = data["symbols"]
-        
         major, minor,  build = self.extract_version(file_path)
         self.major = major
         self.minor = minor
@@ -32,13 +146,68 @@ class OS:
         
         self.stats = None
         self.graphs = {}
-        
-        self.structs = self.resolve_inclusions()
+        self.columns = None
         
         self.file_path = file_path
+        # Hashed in the loader process, for the cache and the manifest
+        self.file_hash = profile_hash(file_path)
+
+        cache_path = self.cache_path(self.file_hash, cache_dir) if cache_dir else None
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, "rb") as f:
+                self.structs, self.types, self.symbols = pickle.load(f)
+            self.raw_structs = {}
+            return
+
+        # Decode the profile entry by entry, symbols are reduced to the information used in the outputs.
+        # The decoded objects are acyclic, the garbage collector would only rescan them over and over
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self.raw_structs = {}
+            self.types = {}
+            self.symbols = {}
+            for section, name, value in iter_profile_entries(file_path):
+                if section == "user_types":
+                    self.raw_structs[name] = value
+                elif section == "base_types":
+                    self.types[name] = value
+                elif section == "symbols":
+                    symbol = self.compact_symbol(value)
+                    if symbol is not None:
+                        self.symbols[name] = symbol
+
+            self.structs = self.resolve_inclusions()
+            self.raw_structs = {} # Raw types are only needed to flatten the structs
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        if cache_path:
+            self.store_cache(cache_path)
+
+    @staticmethod
+    def cache_path(file_hash, cache_dir):
+        # Cached profiles are addressed by the hash of the profile and by the flattening version
+        return os.path.join(cache_dir, f"{file_hash}.v{FLATTEN_VERSION}.pickle")
+
+    @staticmethod
+    def compact_symbol(s_val):
+        try:
+            return {"address": s_val["address"], "type": {"kind": s_val.get("type", {}).get("kind", "")}}
+        except Exception:
+            return None # Malformed symbols are never written in the outputs
+
+    def store_cache(self, cache_path):
+        # Write in a temporary file and rename it, other processes can read the same cache
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump((self.structs, self.types, self.symbols), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
 
     def resolve_inclusions(self):
         flat_structs = {}
+        self.flat_anonymous = {} # Anonymous types flattened at offset 0 without prefix, relocated on each embedding
         for s_name, struct in self.raw_structs.items():
 
             # Ignore structs of zero size (artifacts of dwarf2json)
@@ -46,11 +215,7 @@ class OS:
                 continue
 
             # Ignore anonymous structs
-            try:
-                for anon_prefix in ANONYMOUS_PREFIXES:
-                    if anon_prefix in s_name:
-                        raise UserWarning
-            except UserWarning:
+            if is_anonymous(s_name):
                 continue
 
             # Flat structure
@@ -59,11 +224,24 @@ class OS:
                 flat_structs[s_name] = {
                     "fields": flatted,
                     "size": struct["size"],
-                    "kind": struct["kind"]
+                    "kind": struct["kind"],
+                    "hash": self.struct_hash(flatted, struct["size"], struct["kind"])
                 }
 
+            # Named structs are never flattened again, only their size is needed by the others
+            self.raw_structs[s_name] = {"size": struct["size"]}
+
+        self.flat_anonymous = {}
         return flat_structs
 
+    @staticmethod
+    def struct_hash(flatted, size, kind):
+        # Digest of everything compared by the diff, equal structs of two profiles have equal hashes. Fields are
+        # hashed in declaration order: the same fields declared in another order only make the diff descend
+        content = "\x01".join(f"{f_name}\x00{field.offset}\x00{field.kind}\x00{field.base_type}\x00{field.base_kind}\x00{field.total_size}"
+                               for f_name, field in flatted.items())
+        return hashlib.blake2b(f"{kind}\x00{size}\x01{content}".encode(), digest_size=16).digest()
+
     def recursive_array_size_type(self, field_t):
         total_size = field_t["count"]
         subtype = field_t["subtype"]
@@ -94,9 +272,8 @@ class OS:
             base_type = ""
 
         # Ignore anonymous
-        for anonymous_prefix in ANONYMOUS_PREFIXES:
-            if anonymous_prefix in base_type:
-                return 0, ""
+        if is_anonymous(base_type):
+            return 0, ""
 
         return total_size, base_type
 
@@ -118,17 +295,13 @@ class OS:
 
             # Update structure name
             if parent_f_name:
-                new_field_name = f"{parent_f_name}.{field_n}"
+                new_field_name = sys.intern(f"{parent_f_name}.{field_n}")
             else:
-                new_field_name = field_n
+                new_field_name = sys.intern(field_n)
 
             # Base type
             if field_k == "base":
-                flatted[new_field_name] = {
-                    "offset": field_o + parent_f_offset,
-                    "kind": field_k,
-                    "metadata": {"base_type": field_t["name"]}
-                }
+                flatted[new_field_name] = Field(field_o + parent_f_offset, field_k, field_t["name"])
                 continue
             
             # Bitfield
@@ -136,11 +309,7 @@ class OS:
                 if field_o in bitfields: # Check if the bitfield field (the base object) is already parsed
                     continue
                 
-                flatted[new_field_name] = {
-                    "offset": field_o + parent_f_offset,
-                    "kind": field_k,
-                    "metadata": {"base_type": field_t["type"]["name"]}
-                }
+                flatted[new_field_name] = Field(field_o + parent_f_offset, field_k, field_t["type"]["name"])
                 bitfields.add(field_o)
                 continue
 
@@ -150,11 +319,7 @@ class OS:
                 if total_size == 0: # We ignore definition of arrays of size zero at the end of structures (used to access data after the structure)
                     continue
                 
-                flatted[new_field_name] = {
-                    "offset": field_o + parent_f_offset,
-                    "kind": field_k,
-                    "metadata": {"total_size": total_size, "base_type": base_type}
-                }
+                flatted[new_field_name] = Field(field_o + parent_f_offset, field_k, base_type, total_size=total_size)
                 continue
 
             # Pointer
@@ -163,24 +328,12 @@ class OS:
                 while "subtype" in subtype:
                     subtype = subtype["subtype"]
                 
-                flatted[new_field_name] = {
-                    "offset": field_o + parent_f_offset,
-                    "kind": field_k,
-                    "metadata": {
-                        "base_kind": subtype["kind"],
-                        "base_type": subtype.get("name", "")
-                        }
-                }
+                flatted[new_field_name] = Field(field_o + parent_f_offset, field_k, subtype.get("name", ""), base_kind=subtype["kind"])
                 continue
 
             # Resolve anonymous struct/union
             field_name = field_t.get("name", "")
-            anonymous_struct = False
-            for anon_prefix in ANONYMOUS_PREFIXES:
-                if anon_prefix in field_name:
-                    anonymous_struct = True
-            
-            if anonymous_struct:
+            if is_anonymous(field_name):
     
                 if parent_f_name:
                     if "unnamed_field_" not in field_n:
@@ -193,39 +346,64 @@ class OS:
                     else:
                         new_field_name = ""
                 try:
-                    flatted.update(self.flat_struct(self.raw_structs[field_t["name"]], new_field_name, field["offset"] + parent_f_offset))
+                    flatted.update(self.flat_anonymous_struct(field_name, new_field_name, field["offset"] + parent_f_offset))
                 except KeyError:
                     pass # Sometimes certain anonymous structures are missing...
                 continue
                         
             # Create field metadata (if needed)
             
-            flatted[new_field_name] = {
-                "offset": field["offset"] + parent_f_offset,
-                "kind": "struct" if field_t["kind"] == "class" else field_t["kind"], # We convert class in structs (they have the same implementation)
-                "metadata": {"base_type": field_t["name"]}
-            }
             try:
                 total_size = self.raw_structs[field_t["name"]]["size"]
-                flatted[new_field_name]["metadata"]["total_size"] = total_size
             except KeyError as e:
-                pass
+                total_size = None
+
+            flatted[new_field_name] = Field(
+                field["offset"] + parent_f_offset,
+                "struct" if field_t["kind"] == "class" else field_t["kind"], # We convert class in structs (they have the same implementation)
+                field_t["name"],
+                total_size=total_size
+            )
 
         return flatted
 
-    def extract_version(self, file_path):
-        raise NotImplementedError
+    def flat_anonymous_struct(self, type_name, parent_f_name, parent_f_offset):
+        # Anonymous types are flattened once per profile and then renamed and moved for each embedding
+        try:
+            flatted = self.flat_anonymous[type_name]
+        except KeyError:
+            flatted = self.flat_struct(self.raw_structs[type_name], "", 0)
+            self.flat_anonymous[type_name] = flatted
+
+        if not parent_f_name:
+            if parent_f_offset == 0:
+                return flatted
+            return {f_name: field.moved(parent_f_offset) for f_name, field in flatted.items()}
+        return {sys.intern(f"{parent_f_name}.{f_name}"): field.moved(parent_f_offset) for f_name, field in flatted.items()}
+
+    # Each OS class defines FILE_RE and parse_file, returning (sort key, (major, minor, build), beta) of a profile
+    # from its file name
+    @classmethod
+    def parse_name(cls, file_path):
+        match = cls.FILE_RE.match(os.path.basename(file_path))
+        if match is None:
+            raise ValueError(f"unexpected {cls.name} profile name {file_path}")
+        return match
+
+    @classmethod
+    def extract_version(cls, file_path):
+        return cls.parse_file(file_path)[1]
 
     def get_version(self):
         return  self.version_idx, self.major, self.minor, self.build
 
-    @staticmethod
-    def file_order(filename):
-        raise NotImplementedError
+    @classmethod
+    def file_order(cls, filename):
+        return cls.parse_file(filename)[0]
 
-    @staticmethod
-    def beta_filter(filename):
-        return True
+    @classmethod
+    def beta_filter(cls, filename):
+        return not cls.parse_file(filename)[2]
 
     def type_has_same_size(self, l_type, r_type, right):
         try:
@@ -236,10 +414,16 @@ class OS:
     def __diff_structs_changed(self, commons, right):
         records = []
         # Changed structs/fields
+        OS.structs_compared += len(commons)
         for struct_name in commons:
             left_s = self.structs[struct_name]
             right_s = right.structs[struct_name]
 
+            # Identical structs have no differences
+            if left_s["hash"] == right_s["hash"]:
+                OS.structs_skipped += 1
+                continue
+
             common_fields = sorted(set(left_s["fields"].keys()).intersection(right_s["fields"].keys()))
             new_fields = sorted(set(right_s["fields"].keys()).difference(left_s["fields"].keys()))
             removed_fields = sorted(set(left_s["fields"].keys()).difference(right_s["fields"].keys()))
@@ -289,7 +473,7 @@ class OS:
                     new_field,
                     "",
                     "",
-                    right_s["fields"][new_field]["offset"]
+                    right_s["fields"][new_field].offset
                 ))
 
             # Removed fields
@@ -304,7 +488,7 @@ class OS:
                     "removed",
                     removed_field,
                     "",
-                    left_s["fields"][removed_field]["offset"],
+                    left_s["fields"][removed_field].offset,
                     ""
                 ))
 
@@ -314,7 +498,7 @@ class OS:
                 right_f = right_s["fields"][common_field]
                 
                 # Different offset
-                if left_f["offset"] != right_f["offset"]:
+                if left_f.offset != right_f.offset:
                     records.append((
                         right.version_idx,
                         right.major,
@@ -325,12 +509,12 @@ class OS:
                         "change",
                         common_field,
                         "f_offset",
-                        left_f["offset"],
-                        right_f["offset"],
+                        left_f.offset,
+                        right_f.offset,
                     ))
 
                 # Different kind
-                if left_f["kind"] != right_f["kind"]:
+                if left_f.kind != right_f.kind:
                     records.append((
                         right.version_idx,
                         right.major,
@@ -341,34 +525,32 @@ class OS:
                         "change",
                         common_field,
                         "f_kind",
-                        left_f["kind"],
-                        right_f["kind"],
+                        left_f.kind,
+                        right_f.kind,
                     ))
 
                 # Differences in metadata
-                if "base_type" in left_f["metadata"] and "base_type" in right_f["metadata"]:
-                    if left_f["metadata"]["base_type"] != right_f["metadata"]["base_type"]:
+                if left_f.base_type != right_f.base_type:
+                    # Equivalent type (not pointer)
+                    if left_f.kind != "pointer" and self.type_has_same_size(left_f.base_type, right_f.base_type, right):
+                        continue
 
-                        # Equivalent type (not pointer)
-                        if left_f["kind"] != "pointer" and self.type_has_same_size(left_f["metadata"]["base_type"], right_f["metadata"]["base_type"], right):
-                            continue
-
-                        records.append((
-                            right.version_idx,
-                            right.major,
-                            right.minor,
-                            right.build,
-                            struct_name,
-                            "field",
-                            "change",
-                            common_field,
-                            "f_type",
-                            left_f["metadata"]["base_type"],
-                            right_f["metadata"]["base_type"],
-                        ))
+                    records.append((
+                        right.version_idx,
+                        right.major,
+                        right.minor,
+                        right.build,
+                        struct_name,
+                        "field",
+                        "change",
+                        common_field,
+                        "f_type",
+                        left_f.base_type,
+                        right_f.base_type,
+                    ))
 
-                if "base_kind" in left_f["metadata"] and "base_kind" in right_f["metadata"]:
-                    if left_f["metadata"]["base_kind"] != right_f["metadata"]["base_kind"]:
+                if left_f.base_kind is not None and right_f.base_kind is not None:
+                    if left_f.base_kind != right_f.base_kind:
                         records.append((
                             right.version_idx,
                             right.major,
@@ -379,12 +561,12 @@ class OS:
                             "change",
                             common_field,
                             "f_kind",
-                            left_f["metadata"]["base_kind"],
-                            right_f["metadata"]["base_kind"],
+                            left_f.base_kind,
+                            right_f.base_kind,
                         ))
 
-                if "total_size" in left_f["metadata"] and "total_size" in right_f["metadata"]:
-                    if left_f["metadata"]["total_size"] != right_f["metadata"]["total_size"]:
+                if left_f.total_size is not None and right_f.total_size is not None:
+                    if left_f.total_size != right_f.total_size:
                         records.append((
                             right.version_idx,
                             right.major,
@@ -395,8 +577,8 @@ class OS:
                             "change",
                             common_field,
                             "f_size",
-                            left_f["metadata"]["total_size"],
-                            right_f["metadata"]["total_size"],
+                            left_f.total_size,
+                            right_f.total_size,
                         ))
 
         return records
@@ -431,22 +613,139 @@ class OS:
 
 
 
-    def __diff_structs(self, right):
+    def columnar_fields(self):
+        # Flattened fields as columns sorted by "struct\x01field" key, built once per profile (it is diffed
+        # both as left and as right). Missing base_kind are "" and missing total_size -1
+        if self.columns is not None:
+            return self.columns
+
+        keys, offsets, kinds, base_types, base_kinds, total_sizes = [], [], [], [], [], []
+        for s_name, struct in self.structs.items():
+            for f_name, field in struct["fields"].items():
+                keys.append(f"{s_name}\x01{f_name}")
+                offsets.append(field.offset)
+                kinds.append(field.kind)
+                base_types.append(field.base_type)
+                base_kinds.append(field.base_kind if field.base_kind is not None else "")
+                total_sizes.append(field.total_size if field.total_size is not None else -1)
+
+        keys = np.array(keys, dtype=str)
+        order = np.argsort(keys, kind="stable")
+        s_names = sorted(self.structs.keys())
+        self.columns = {
+            "key": keys[order],
+            "offset": np.array(offsets, dtype=np.int64)[order],
+            "kind": np.array(kinds, dtype=str)[order],
+            "base_type": np.array(base_types, dtype=str)[order],
+            "base_kind": np.array(base_kinds, dtype=str)[order],
+            "total_size": np.array(total_sizes, dtype=np.int64)[order],
+            "s_name": np.array(s_names, dtype=str),
+            "s_size": np.array([self.structs[x]["size"] for x in s_names], dtype=np.int64),
+            "s_kind": np.array([self.structs[x]["kind"] for x in s_names], dtype=str)
+        }
+        return self.columns
+
+    @staticmethod
+    def sorted_match(sorted_values, values):
+        # Index of values in the sorted array and mask of the values found
+        if len(sorted_values) == 0:
+            return np.zeros(len(values), dtype=np.int64), np.zeros(len(values), dtype=bool)
+        idx = np.minimum(np.searchsorted(sorted_values, values), len(sorted_values) - 1)
+        return idx, sorted_values[idx] == values
+
+    def __diff_structs_changed_columnar(self, right):
+        # Same records of __diff_structs_changed, in the same order. Structs and fields are matched by
+        # binary search on the sorted columns, only the changed ones are visited in Python
+        left_c = self.columnar_fields()
+        right_c = right.columnar_fields()
+        version = (right.version_idx, right.major, right.minor, right.build)
+        keyed = [] # (struct name, group, field name, property rank, record)
+
+        # Changes in structure metadata
+        s_idx, s_found = self.sorted_match(left_c["s_name"], right_c["s_name"])
+        r_s = np.flatnonzero(s_found)
+        l_s = s_idx[r_s]
+        changed = (left_c["s_size"][l_s] != right_c["s_size"][r_s]) | (left_c["s_kind"][l_s] != right_c["s_kind"][r_s])
+        for l, r in zip(l_s[changed].tolist(), r_s[changed].tolist()):
+            s_name = right_c["s_name"][r].item()
+            l_size, r_size = left_c["s_size"][l].item(), right_c["s_size"][r].item()
+            l_kind, r_kind = left_c["s_kind"][l].item(), right_c["s_kind"][r].item()
+            if l_size != r_size:
+                keyed.append((s_name, 0, "", 0, (*version, s_name, l_kind, "change", "", "s_size", l_size, r_size)))
+            if l_kind != r_kind:
+                keyed.append((s_name, 1, "", 0, (*version, s_name, l_kind, "change", "", "s_kind", l_kind, r_kind)))
+
+        # Match the fields, a field present in both profiles belongs to a common struct
+        f_idx, f_found = self.sorted_match(left_c["key"], right_c["key"])
+        right_idx = np.flatnonzero(f_found)
+        left_idx = f_idx[right_idx]
+        left_found = np.zeros(len(left_c["key"]), dtype=bool)
+        left_found[left_idx] = True
+
+        # Added and removed fields (only in common structs)
+        for c, found, other, group in ((right_c, f_found, left_c, 2), (left_c, left_found, right_c, 3)):
+            candidates = np.flatnonzero(~found)
+            if len(candidates) == 0:
+                continue
+            s_names = np.array([k.split("\x01", 1)[0] for k in c["key"][candidates].tolist()])
+            _, in_common = self.sorted_match(other["s_name"], s_names)
+            for idx in candidates[in_common].tolist():
+                s_name, f_name = c["key"][idx].item().split("\x01", 1)
+                offset = c["offset"][idx].item()
+                if group == 2:
+                    keyed.append((s_name, 2, f_name, 0, (*version, s_name, "field", "added", f_name, "", "", offset)))
+                else:
+                    keyed.append((s_name, 3, f_name, 0, (*version, s_name, "field", "removed", f_name, "", offset, "")))
+
+        # Differences in common fields
+        columns = ("offset", "kind", "base_type", "base_kind", "total_size")
+        left_v = {column: left_c[column][left_idx] for column in columns}
+        right_v = {column: right_c[column][right_idx] for column in columns}
+        changed = np.zeros(len(left_idx), dtype=bool)
+        for column in columns:
+            changed |= left_v[column] != right_v[column]
+
+        for pos in np.flatnonzero(changed).tolist():
+            s_name, f_name = right_c["key"][right_idx[pos]].item().split("\x01", 1)
+            l_off, l_kind, l_type, l_bkind, l_size = (left_v[c][pos].item() for c in columns)
+            r_off, r_kind, r_type, r_bkind, r_size = (right_v[c][pos].item() for c in columns)
+
+            if l_off != r_off:
+                keyed.append((s_name, 4, f_name, 0, (*version, s_name, "field", "change", f_name, "f_offset", l_off, r_off)))
+            if l_kind != r_kind:
+                keyed.append((s_name, 4, f_name, 1, (*version, s_name, "field", "change", f_name, "f_kind", l_kind, r_kind)))
+            if l_type != r_type:
+                # Equivalent type (not pointer), the other metadata are not compared
+                if l_kind != "pointer" and self.type_has_same_size(l_type, r_type, right):
+                    continue
+                keyed.append((s_name, 4, f_name, 2, (*version, s_name, "field", "change", f_name, "f_type", l_type, r_type)))
+            if l_bkind and r_bkind and l_bkind != r_bkind:
+                keyed.append((s_name, 4, f_name, 3, (*version, s_name, "field", "change", f_name, "f_kind", l_bkind, r_bkind)))
+            if l_size >= 0 and r_size >= 0 and l_size != r_size:
+                keyed.append((s_name, 4, f_name, 4, (*version, s_name, "field", "change", f_name, "f_size", l_size, r_size)))
+
+        keyed.sort(key=lambda x: x[:4])
+        return [x[4] for x in keyed]
+
+    def __diff_structs(self, right, engine="python"):
         added = set(right.structs.keys()).difference(self.structs.keys())
         removed = set(self.structs.keys()).difference(right.structs.keys())
         commons = set(self.structs.keys()).intersection(right.structs.keys())
 
         results = []
-        results = self.__diff_structs_changed(sorted(commons), right)
+        if engine == "columnar":
+            results = self.__diff_structs_changed_columnar(right)
+        else:
+            results = self.__diff_structs_changed(sorted(commons), right)
         results.extend(self.__diff_structs_add_rem(sorted(added), "added", right))
         results.extend(self.__diff_structs_add_rem(sorted(removed), "removed", right))
 
         return results
 
 
-    def diff_structs(self, right):
+    def diff_structs(self, right, engine="python"):
         # Create diff results
-        records = self.__diff_structs(right)
+        records = self.__diff_structs(right, engine)
         records = list(set(records))
         records.sort(key=lambda x: x[2])
         return records
@@ -491,35 +790,35 @@ class OS:
             f_array_count = 0
             
             for field_name, field in struct["fields"].items():
-                field_k = field["kind"]
+                field_k = field.kind
 
                 if field_name not in fields[s_name]:
                     fields[s_name][field_name] = field_k
 
                 # Ignore empty base type fields (they are pointer to functions for example)
-                if field["metadata"]["base_type"] == "":
+                if field.base_type == "":
                     continue
 
                 if field_k == "struct":
-                    graphs["embedded"][(s_name, field["metadata"]["base_type"])] += 1
+                    graphs["embedded"][(s_name, field.base_type)] += 1
                     graphs["nodes"].append(s_name)
                     f_struct_count += 1
 
                 elif field_k == "union":
-                    if field["metadata"]["base_type"] not in self.types:
-                        graphs["embedded"][(s_name, field["metadata"]["base_type"])] += 1
+                    if field.base_type not in self.types:
+                        graphs["embedded"][(s_name, field.base_type)] += 1
                         graphs["nodes"].append(s_name)
                     f_union_count += 1
 
                 elif field_k == "pointer":
-                    if field["metadata"]["base_type"] not in self.types:
-                        graphs["pointers"][(s_name, field["metadata"]["base_type"])] += 1
+                    if field.base_type not in self.types:
+                        graphs["pointers"][(s_name, field.base_type)] += 1
                         graphs["nodes"].append(s_name)
                     f_pointer_count += 1
 
                 elif field_k == "array":
-                    if field["metadata"]["base_type"] not in self.types:
-                        graphs["pointers"][(s_name, field["metadata"]["base_type"])] += 1
+                    if field.base_type not in self.types:
+                        graphs["pointers"][(s_name, field.base_type)] += 1
                         graphs["nodes"].append(s_name)
                     f_array_count += 1
 
@@ -570,6 +869,28 @@ class OS:
         }
         return stats
 
+    def graph_summary_records(self):
+        # Size, degree and weakly connected components of the graphs, enough for the plots that do not need the topology
+        records = []
+        for g_name, graph in self.graphs.items():
+            nodes = graph.vcount()
+            components = graph.connected_components(mode="weak").sizes()
+            records.append((
+                self.version_idx,
+                self.major,
+                self.minor,
+                self.build,
+                g_name,
+                nodes,
+                graph.ecount(),
+                max(graph.indegree(), default=0),
+                max(graph.outdegree(), default=0),
+                graph.ecount() / nodes if nodes else 0.0, # Mean in (and out) degree
+                len(components),
+                max(components, default=0)
+            ))
+        return records
+
     def records_to_csv(self, iterable):
         return ["|".join((str(i) for i in it_obj)) + "\n" for it_obj in iterable]
 
@@ -577,11 +898,14 @@ class OS:
         stats = self.generate_stats(fields)
         return self.records_to_csv(stats)
 
-    def diffs_to_csv(self, right):
-        stats = self.diff_structs(right)
+    def diffs_to_csv(self, right, engine="python"):
+        stats = self.diff_structs(right, engine)
         return self.records_to_csv(stats)
 
     def symbols_to_csv(self):
+        return self.records_to_csv(self.symbols_records())
+
+    def symbols_records(self):
         symbols_l = []
         for s_name, s_val in self.symbols.items():
             try:
@@ -593,107 +917,179 @@ class OS:
             except:
                 # Should not happens....
                 continue
-        return self.records_to_csv(symbols_l)
+        return symbols_l
 
 class XNU(OS):
     name = "xnu"
-
-    def extract_version(self, file_path):
-        filename_s = file_path.split("/")[-1].split("_")
-        version_l = filename_s[2].split(".")
-        if version_l[0] == '10':
-            major = f"10.{version_l[1]}"
-            minor = version_l[2]
+    # macOS_kernel_{version}_KDK-{build}.json.xz, e.g. 10.6.1 and 10A432, beta builds end with a letter
+    FILE_RE = re.compile(r"[^_]*_[^_]*_(?P<v_major>\d+)\.(?P<v_minor>\d+)(?:\.(?P<v_patch>\d+))?[^_]*_(?:[^_]*-)?"
+                         r"(?P<build>(?P<b_major>\d\d)(?P<b_minor>[^-_.])(?P<b_patch>\d+)(?P<b_beta>[A-Za-z]?))(?=[._]|$)")
+
+    @classmethod
+    def parse_file(cls, file_path):
+        match = cls.parse_name(file_path)
+        if match["v_major"] == "10":
+            major = f"10.{match['v_minor']}"
+            minor = match["v_patch"] or "0"
         else:
-            major = version_l[0]
-            minor = version_l[1]
-
-        build = filename_s[3].split("-")[-1].split(".")[0]
-
-        return major, minor, build
+            major = match["v_major"]
+            minor = match["v_minor"]
 
-    @staticmethod
-    def file_order(filename):
-        build = filename.split("/")[-1].split("-")[-1].split(".")[0]
-        major = int(build[:2])
-        minor = build[2]
-        patch = build[3:]
-
-        if patch[-1].isalpha():
-            if patch[0] == "5" and len(patch[:-1]) > 3:
-                patch1 = int(patch[1:-1])
-            else:
-                patch1 = int(patch[:-1])
-            patch2 = patch[-1]
+        patch = match["b_patch"]
+        if match["b_beta"]:
+            patch1 = int(patch[1:]) if patch[0] == "5" and len(patch) > 3 else int(patch)
+            patch2 = match["b_beta"]
         else:
             patch1 = int(patch)
             patch2 = "z"
 
-        return major, minor, patch1, patch2
-
-    @staticmethod
-    def beta_filter(filename):
-        patch = filename.split("/")[-1].split("-")[-1].split(".")[0][3:]
-        return not(patch[-1].isalpha())
+        return (int(match["b_major"]), match["b_minor"], patch1, patch2), (major, minor, match["build"]), bool(match["b_beta"])
 
 class Windows(OS):
     name = "win"
+    # {major}.{minor}.{build}.{revision}.json.xz, e.g. 6.1.7601.17514
+    FILE_RE = re.compile(r"(?P<version>\d+(?:\.\d+)*)\.[^.]*\.[^.]*$")
+    MAJORS = {("5", None): "XP", ("6", "0"): "Vista", ("6", "1"): "7", ("6", "2"): "8", ("6", "3"): "8.1"}
+
+    @classmethod
+    def parse_file(cls, file_path):
+        version = cls.parse_name(file_path)["version"].split(".")
+        M, m, minor, build = version[:4]
+        if M == "10":
+            major = "10" if int(minor) < 22000 else "11"
+        else:
+            major = cls.MAJORS.get((M, None), cls.MAJORS.get((M, m)))
 
-    @staticmethod
-    def file_order(filename):
-        return [int(x) for x in filename.split("/")[-1].split(".")[:-2]]
-
-    def extract_version(self, file_path):
-        filename_s = file_path.split("/")[-1]
-        M, m, minor, build = filename_s.split(".")[:4]
-        if M == '5':
-            major = 'XP' # XP
-        elif M == '6':
-            if m == '0': # Vista
-                major = 'Vista'
-            elif m == '1': # Win 7
-                major = "7"
-            elif m == '2': # Win 8
-                major = '8'
-            elif m == '3': # Win 8.1
-                major = "8.1"
-        elif M == '10':
-            if int(minor) < 22000:
-                major = "10"
-            else:
-                major = "11"
-
-        return major, minor, build
+        return tuple(int(x) for x in version), (major, minor, build), False
 
 class LNX(OS):
     name = "lnx"
-
-    @staticmethod
-    def file_order(filename):
-        version = filename.split("/")[-1].split("_")[2].split("_")[0]
-        major, minor, build = version.split(".")
-        build, patch = build.split("-")
-        patch_s = patch.split("+")
-
-        return int(major), int(minor), int(build), *patch_s
-
-    def extract_version(self, file_path):
-        filename_s = file_path.split("/")[-1].split("_")[2]
-
-        version_split = filename_s.split(".")
-        if version_split[0] == '2':
-            major = ".".join(version_split[:2])
-            minor, build = version_split[2].split("-")
+    # linux-image_{arch}_{major}.{minor}.{build}-{patch}_..., e.g. 2.6.32-5 and 5.10.46-4+deb11u1
+    FILE_RE = re.compile(r"[^_]*_[^_]*_(?P<major>\d+)\.(?P<minor>\d+)\.(?P<build>\d+)-(?P<patch>[^-._]*)(?:_|$)")
+
+    @classmethod
+    def parse_file(cls, file_path):
+        match = cls.parse_name(file_path)
+        if match["major"] == "2":
+            version = (f"2.{match['minor']}", match["build"], match["patch"])
         else:
-            major = version_split[0]
-            minor = version_split[1]
-            build = ".".join(version_split[2:])
-
-        return major, minor, build
+            version = (match["major"], match["minor"], f"{match['build']}-{match['patch']}")
+
+        return (int(match["major"]), int(match["minor"]), int(match["build"]), *match["patch"].split("+")), version, False
+
+def load_profile(os_class, file_path, version_idx, cache_dir=None, columnar=False):
+    profile = os_class(file_path, version_idx, cache_dir)
+    if columnar: # Build the columns used by the columnar diff engine in the worker
+        profile.columnar_fields()
+    return profile
+
+def load_profiles(os_class, file_paths, jobs=1, prefetch=None, cache_dir=None, columnar=False, first_idx=0):
+    # Yield the parsed profiles in version order, numbered from first_idx. With more than one job the
+    # profiles are decompressed and flattened in a process pool, keeping at most prefetch profiles in flight
+    if jobs <= 1:
+        for version_idx, file_path in enumerate(file_paths, first_idx):
+            yield load_profile(os_class, file_path, version_idx, cache_dir, columnar)
+        return
+
+    if prefetch is None:
+        prefetch = 2 * jobs
+
+    paths = enumerate(file_paths, first_idx)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = deque(pool.submit(load_profile, os_class, file_path, version_idx, cache_dir, columnar) for version_idx, file_path in islice(paths, max(prefetch, 1)))
+        while pending:
+            profile = pending.popleft().result()
+
+            # Refill the window before handing out the profile
+            for version_idx, file_path in islice(paths, 1):
+                pending.append(pool.submit(load_profile, os_class, file_path, version_idx, cache_dir, columnar))
+
+            yield profile
+
+def scan_dataset(os_class, dataset_dir, threads=SCAN_THREADS):
+    # Dataset manifest: path (relative to dataset_dir), size, sort key, version and beta flag of every profile
+    # in version order. Files are only listed and stat-ed (in threads, the dataset can be on a network file
+    # system) and their names parsed once. Equal sort keys are ordered by path, the order does not depend on
+    # the directory listing
+    rel_paths = []
+    for root, _, files in os.walk(dataset_dir):
+        for file in files:
+            rel_paths.append(os.path.relpath(os.path.join(root, file), dataset_dir))
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        sizes = list(pool.map(lambda rel_path: os.stat(os.path.join(dataset_dir, rel_path)).st_size, rel_paths))
+
+    entries = []
+    for rel_path, size in zip(rel_paths, sizes):
+        order, version, beta = os_class.parse_file(rel_path)
+        entries.append({"file": rel_path, "size": size, "order": order, "version": version, "beta": beta})
+    entries.sort(key=lambda entry: (entry["order"], entry["file"]))
+    return entries
+
+def baseline_indices(majors, scheme, keyframe):
+    # Version each version is diffed against: the previous one (adjacent), the first one of its major
+    # release (major) or the last multiple of keyframe (keyframe). The first version has no adjacent baseline
+    bases = []
+    for version_idx, major in enumerate(majors):
+        if scheme == "adjacent":
+            bases.append(version_idx - 1)
+        elif scheme == "major":
+            bases.append(version_idx if version_idx == 0 or major != majors[version_idx - 1] else bases[-1])
+        else:
+            bases.append(version_idx - version_idx % keyframe)
+    return bases
+
+class ProfileLRU:
+    # Flattened profiles kept as diff baselines. Only the profiles that are the baseline of a later version other
+    # than the next one (diffed as left side) are kept, until their last use or until more than size are retained:
+    # an evicted profile is loaded again when needed
+    def __init__(self, os_class, file_paths, bases, size, cache_dir=None, columnar=False):
+        self.os_class = os_class
+        self.file_paths = file_paths
+        self.size = size
+        self.cache_dir = cache_dir
+        self.columnar = columnar
+        self.last_use = {}
+        for version_idx, base_idx in enumerate(bases):
+            if 0 <= base_idx < version_idx - 1:
+                self.last_use[base_idx] = version_idx
+        self.profiles = OrderedDict()
+        self.loads = 0
+
+    def keep(self, profile):
+        if self.last_use.get(profile.version_idx, -1) > profile.version_idx:
+            self.profiles[profile.version_idx] = profile
+            self.profiles.move_to_end(profile.version_idx)
+            while len(self.profiles) > self.size:
+                self.profiles.popitem(last=False)
+
+    def get(self, version_idx):
+        if version_idx in self.profiles:
+            self.profiles.move_to_end(version_idx)
+            return self.profiles[version_idx]
+        self.loads += 1
+        profile = load_profile(self.os_class, self.file_paths[version_idx], version_idx, self.cache_dir, self.columnar)
+        self.keep(profile)
+        return profile
+
+    def release(self, version_idx):
+        # Drop the baselines not used after version_idx
+        for base_idx in [base_idx for base_idx in self.profiles if self.last_use[base_idx] <= version_idx]:
+            del self.profiles[base_idx]
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('-no-beta', action="store_true")
+    parser.add_argument('-j', type=int, default=1, help='Number of processes used to load profiles')
+    parser.add_argument('-prefetch', type=int, default=None, help='Maximum number of profiles loaded ahead (default 2 * j)')
+    parser.add_argument('-cache', type=str, default=None, help='Directory of the cached flattened profiles')
+    parser.add_argument('-format', choices=("csv", "parquet"), default="csv", help='Format of changes, stats and symbols tables')
+    parser.add_argument('-diff-engine', choices=("python", "columnar"), default="python", help='Struct diffing implementation')
+    parser.add_argument('-symbols-keyframe', type=int, default=50, help='Write all the symbols every N versions, only the changed ones otherwise')
+    parser.add_argument('-baseline', choices=("adjacent", "major", "keyframe"), default="adjacent", help='Also diff every version against the first version of its major release or against the last keyframe')
+    parser.add_argument('-baseline-k', type=int, default=50, help='Keyframe interval of -baseline keyframe')
+    parser.add_argument('-baseline-lru', type=int, default=2, help='Maximum number of baseline profiles kept in memory')
+    parser.add_argument('-append', action='store_true', help='Only process the profiles missing from the manifest of a previous run and append their outputs')
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument('-win', action='store_true')
     group.add_argument('-xnu', action='store_true')
@@ -705,13 +1101,6 @@ def main():
     output_dir = os.getcwd()
     fields = defaultdict(dict)
 
-    # List all the files in the dataset directory and return ordered according to version
-    file_paths = []
-    for root, _, files in os.walk(dataset_dir):
-        for file in files:
-            file_path = os.path.join(root, file)
-            file_paths.append(file_path)
-
     if args.win:
         OS_CLASS = Windows
     elif args.xnu:
@@ -719,47 +1108,134 @@ def main():
     else:
         OS_CLASS = LNX
 
-    if args.no_beta:
-        file_paths = list(filter(OS_CLASS.beta_filter, file_paths))
-    file_paths.sort(key=OS_CLASS.file_order)
+    if args.cache:
+        os.makedirs(args.cache, exist_ok=True)
 
-    # Prepare output files
-    with open(output_dir + f"/changes_{OS_CLASS.name}", "w") as changes_f, open(output_dir + f"/stats_{OS_CLASS.name}", "w") as stats_f, open(output_dir + f"/symbols_{OS_CLASS.name}", "w") as symbols_f:
-        changes_f.write("vidx|major|minor|build|s_name|kind|difference|f_name|property|old_val|new_val\n")
-        stats_f.write("vidx|major|minor|build|s_name|kind|size|fields|e_structs|e_union|pointers|arrays\n")
-        symbols_f.write("vidx|major|minor|build|s_name|kind|address\n")
+    # List all the profiles in the dataset directory ordered according to version, the list is kept in
+    # dataset_{os}.json to know which profiles a run used
+    dataset = scan_dataset(OS_CLASS, dataset_dir)
+    dataset_path = output_dir + f"/dataset_{OS_CLASS.name}.json"
+    with open(dataset_path + ".tmp", "w") as f:
+        json.dump(dataset, f, indent=1)
+    os.replace(dataset_path + ".tmp", dataset_path)
 
-        ptrs = []
-        emb = []
+    if args.no_beta:
+        dataset = [entry for entry in dataset if not entry["beta"]]
+    file_paths = [os.path.join(dataset_dir, entry["file"]) for entry in dataset]
+
+    # Profiles already represented in the outputs, in version order, and state of the appended tables
+    manifest_path = output_dir + f"/manifest_{OS_CLASS.name}.json"
+    processed = []
+    committed = {}
+    if args.append and os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        processed = manifest["profiles"]
+        committed = manifest["tables"]
+
+    rel_paths = [entry["file"] for entry in dataset]
+    if processed:
+        # New profiles can only follow the processed ones, otherwise the vidx of the outputs would shift
+        if rel_paths[:len(processed)] != [entry["file"] for entry in processed]:
+            parser.error("the dataset does not extend the processed profiles, run without -append")
+        if len(processed) == len(file_paths):
+            print("No new profiles to append")
+            return
+
+    # The last processed profile is loaded again only as left side of the first diff
+    first_idx = max(len(processed) - 1, 0)
+    appending = len(processed) > 0
+    append = len(processed) if appending else None
+
+    # Tables extended by -append, the other outputs are rewritten at the end of each run
+    table = ParquetTable if args.format == "parquet" else CSVTable
+    table_names = ["changes", "stats", "symbols", "graph_nodes", "graph_edges", "graph_summary", "impact"]
+    if args.baseline != "adjacent":
+        table_names.append(f"changes_{args.baseline}")
+    table_paths = {name: output_dir + f"/{name}_{OS_CLASS.name}" for name in table_names}
+
+    if appending:
+        # Drop what a failed -append run wrote after the last complete run
+        for name, path in table_paths.items():
+            table.rollback(path, committed.get(name))
+        with open(output_dir + f"/fields_{OS_CLASS.name}.json") as f:
+            fields.update(json.load(f))
+    elif os.path.exists(manifest_path):
+        # The outputs are rewritten, they match no manifest until the run completes
+        os.remove(manifest_path)
+
+    # Diffs against non adjacent baselines go to changes_{baseline}_{os}, the adjacent ones are in changes_{os}
+    columnar = args.diff_engine == "columnar"
+    bases = baseline_indices([entry["version"][0] for entry in dataset], args.baseline, args.baseline_k)
+    baselines = ProfileLRU(OS_CLASS, file_paths, bases, args.baseline_lru, args.cache, columnar)
+
+    # Parse the first profile, hashed by the loader as all the profiles
+    profiles = load_profiles(OS_CLASS, file_paths[first_idx:], args.j, args.prefetch, args.cache, columnar, first_idx)
+    left = next(profiles)
+    if appending and left.file_hash != processed[-1]["hash"]:
+        parser.error(f"{processed[-1]['file']} changed since it was processed, run without -append")
 
-        # Parse the first profile
-        left = OS_CLASS(file_paths[0], 0)
-        stats_f.writelines(left.stats_to_csv(fields))
-        symbols_f.writelines(left.symbols_to_csv())
-        ptrs.append(left.graphs["pointers"])
-        emb.append(left.graphs["embedded"])
+    # Prepare output files
+    with table(table_paths["changes"], CHANGES_COLUMNS, append) as changes_t, \
+         table(table_paths["stats"], STATS_COLUMNS, append) as stats_t, \
+         SymbolDeltaWriter(table_paths["symbols"], table, append, args.symbols_keyframe) as symbols_t, \
+         GraphStoreWriter(output_dir, OS_CLASS.name, table, append) as graphs_t, \
+         table(table_paths["graph_summary"], GRAPH_SUMMARY_COLUMNS, append) as graph_summary_t, \
+         FieldLifetimeWriter(output_dir + f"/field_lifetimes_{OS_CLASS.name}", table, append) as lifetimes_t, \
+         ImpactWriter(output_dir, OS_CLASS.name, table, append) as impact_t, \
+         (table(table_paths[f"changes_{args.baseline}"], BASELINE_CHANGES_COLUMNS, append) if args.baseline != "adjacent" else nullcontext()) as baseline_t:
+
+        if not appending:
+            stats_t.write(left.generate_stats(fields))
+            symbols_t.add(left.version_idx, left.major, left.minor, left.build, left.symbols_records())
+            graphs_t.add(left.version_idx, left.graphs)
+            graph_summary_t.write(left.graph_summary_records())
+            lifetimes_t.add(left.version_idx, left.structs)
+            impact_t.add(left.version_idx, left.graphs["embedded"])
+            processed.append({"vidx": left.version_idx, "file": rel_paths[0], "hash": left.file_hash})
+        else:
+            symbols_t.set_previous(left.symbols_records())
+            left.generate_stats(fields)
+            impact_t.set_previous(left.graphs["embedded"])
+        baselines.keep(left)
 
         # Compare previous profile with current one and parse current one
-        for version_idx, file_path in enumerate(tqdm(file_paths[1:]), start=1):
-            right = OS_CLASS(file_path, version_idx)
-            stats_f.writelines(right.stats_to_csv(fields))
-            changes_f.writelines(left.diffs_to_csv(right))
-            symbols_f.writelines(right.symbols_to_csv())
-
-            ptrs.append(right.graphs["pointers"])
-            emb.append(right.graphs["embedded"])
+        for right in tqdm(profiles, total=len(file_paths) - first_idx - 1):
+            stats_t.write(right.generate_stats(fields))
+            changes = left.diff_structs(right, args.diff_engine)
+            changes_t.write(changes)
+            if baseline_t is not None:
+                base_idx = bases[right.version_idx]
+                if base_idx != right.version_idx:
+                    if base_idx != left.version_idx:
+                        changes = baselines.get(base_idx).diff_structs(right, args.diff_engine)
+                    baseline_t.write([(base_idx, *record) for record in changes])
+                baselines.keep(right)
+                baselines.release(right.version_idx)
+            symbols_t.add(right.version_idx, right.major, right.minor, right.build, right.symbols_records())
+
+            graphs_t.add(right.version_idx, right.graphs)
+            graph_summary_t.write(right.graph_summary_records())
+            lifetimes_t.add(right.version_idx, right.structs)
+            impact_t.add(right.version_idx, right.graphs["embedded"])
+            processed.append({"vidx": right.version_idx, "file": rel_paths[right.version_idx], "hash": right.file_hash})
 
             left = right
 
-    # Save graphs
-    with open(output_dir + f"/ptrs_graph_{OS_CLASS.name}", "wb") as f:
-        pickle.dump(ptrs, f)
-
-    with open(output_dir + f"/emb_graph_{OS_CLASS.name}", "wb") as f:
-        pickle.dump(emb, f)
+    if OS.structs_compared:
+        print(f"Skipped {OS.structs_skipped}/{OS.structs_compared} unchanged common structs ({100 * OS.structs_skipped / OS.structs_compared:.1f}%)")
+    if args.baseline != "adjacent":
+        print(f"Loaded {baselines.loads} baseline profiles again (-baseline-lru {args.baseline_lru})")
 
     with open(output_dir + f"/fields_{OS_CLASS.name}.json", "w") as f:
         json.dump(fields, f)
 
+    # The manifest is written last, once all the outputs are complete. A later -append truncates the tables
+    # back to the recorded state before adding its records
+    manifest = {"profiles": processed, "tables": {name: table.committed(path) for name, path in table_paths.items()}}
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,536 @@
+#!/usr/bin/env python3
+
+# Output tables of profile_differ.py and their readers used by analysis.py
+
+import glob
+import heapq
+import os
+import pickle
+import tempfile
+import igraph as ig
+import numpy as np
+import pandas as pd
+from collections import defaultdict
+from itertools import islice
+
+CHANGES_COLUMNS = (("vidx", "int32"), ("major", "string"), ("minor", "string"), ("build", "string"), ("s_name", "string"), ("kind", "string"),
+                   ("difference", "string"), ("f_name", "string"), ("property", "string"), ("old_val", "string"), ("new_val", "string"))
+STATS_COLUMNS = (("vidx", "int32"), ("major", "string"), ("minor", "string"), ("build", "string"), ("s_name", "string"), ("kind", "string"),
+                 ("size", "int64"), ("fields", "int32"), ("e_structs", "int32"), ("e_union", "int32"), ("pointers", "int32"), ("arrays", "int32"))
+BASELINE_CHANGES_COLUMNS = (("base_vidx", "int32"),) + CHANGES_COLUMNS
+SYMBOL_DELTAS_COLUMNS = (("vidx", "int32"), ("major", "string"), ("minor", "string"), ("build", "string"), ("op", "string"), ("s_name", "string"),
+                         ("kind", "string"), ("address", "uint64"))
+GRAPH_SUMMARY_COLUMNS = (("vidx", "int32"), ("major", "string"), ("minor", "string"), ("build", "string"), ("graph", "string"), ("nodes", "int32"),
+                         ("edges", "int32"), ("max_in_degree", "int32"), ("max_out_degree", "int32"), ("mean_degree", "float64"), ("components", "int32"),
+                         ("largest_component", "int32"))
+IMPACT_COLUMNS = (("s_name", "string"), ("impacted", "string"), ("first_vidx", "int32"), ("last_vidx", "int32"))
+FIELD_RUNS_COLUMNS = (("s_name", "string"), ("f_name", "string"), ("first_vidx", "int32"), ("last_vidx", "int32"), ("offset", "int64"), ("kind", "string"),
+                      ("base_type", "string"))
+GRAPH_NODES_COLUMNS = (("graph", "string"), ("name", "string"), ("first_vidx", "int32"), ("last_vidx", "int32"))
+GRAPH_EDGES_COLUMNS = (("graph", "string"), ("src", "string"), ("dst", "string"), ("weight", "int32"), ("first_vidx", "int32"), ("last_vidx", "int32"))
+FIELD_RUNS_CHUNK = 1 << 18 # Closed field runs kept in memory before being spilled to disk
+SPILL_BLOCK = 1 << 12 # Field runs pickled at once in a spill file
+
+class CSVTable:
+    # Pipe separated table, one line per record. When append is the vidx of the first
+    # new version the records are added to an existing table
+    suffix = ""
+
+    def __init__(self, path, columns, append=None):
+        if append is not None and os.path.exists(path):
+            self.f = open(path, "a")
+        else:
+            self.f = open(path, "w")
+            self.f.write("|".join(name for name, _ in columns) + "\n")
+
+    def write(self, records):
+        self.f.writelines("|".join((str(i) for i in it_obj)) + "\n" for it_obj in records)
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def committed(path):
+        # State of the table recorded in the manifest once a run completes: its size
+        return os.path.getsize(path) if os.path.exists(path) else None
+
+    @staticmethod
+    def rollback(path, state):
+        # Drop the records a failed -append run wrote after the committed state
+        if state is None:
+            if os.path.exists(path):
+                os.remove(path)
+        elif os.path.exists(path) and os.path.getsize(path) > state:
+            os.truncate(path, state)
+
+class ParquetTable(CSVTable):
+    # Parquet table with dictionary encoded strings, each write (a version) is a separate row group.
+    # Parquet files cannot be extended, so in append mode the records go to a new part file
+    # {path}.{first_vidx}.parquet read back together with {path}.parquet
+    suffix = ".parquet"
+
+    def __init__(self, path, columns, append=None):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pq = pq
+        self.pa = pa
+        self.columns = columns
+        self.schema = pa.schema([(name, pa.dictionary(pa.int32(), pa.string()) if c_type == "string" else getattr(pa, c_type)()) for name, c_type in columns])
+        if append is not None and os.path.exists(f"{path}.parquet"):
+            file_path = f"{path}.{append:06d}.parquet"
+        else:
+            # Part files of previous runs do not belong to the new table
+            for part in glob.glob(f"{glob.escape(path)}.*.parquet"):
+                os.remove(part)
+            file_path = f"{path}.parquet"
+        self.writer = pq.ParquetWriter(file_path, self.schema, use_dictionary=True, compression="zstd")
+
+    def write(self, records):
+        if not records:
+            return
+
+        arrays = []
+        for (name, c_type), values in zip(self.columns, zip(*records)):
+            if c_type == "string":
+                # Empty values are stored as nulls, as they are read from the CSV files
+                arrays.append(self.pa.array([None if v == "" else str(v) for v in values], self.pa.string()).dictionary_encode())
+            else:
+                arrays.append(self.pa.array(values, getattr(self.pa, c_type)()))
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+    @staticmethod
+    def parts(path):
+        return [part for part in [f"{path}.parquet"] + glob.glob(f"{glob.escape(path)}.*.parquet") if os.path.exists(part)]
+
+    @staticmethod
+    def committed(path):
+        # State of the table recorded in the manifest once a run completes: its files
+        return sorted(os.path.basename(part) for part in ParquetTable.parts(path))
+
+    @staticmethod
+    def rollback(path, state):
+        # Remove the part files written by a failed -append run
+        for part in ParquetTable.parts(path):
+            if os.path.basename(part) not in (state or ()):
+                os.remove(part)
+
+def load_table(path, dtype={'major': str, 'minor': str, 'build': str}, **kwargs):
+    # Load the columnar version of the table if profile_differ.py was run with -format parquet,
+    # followed by the part files added by -append runs
+    if os.path.exists(f"{path}.parquet"):
+        parts = [f"{path}.parquet"] + sorted(glob.glob(f"{glob.escape(path)}.*.parquet"))
+        df = pd.concat([pd.read_parquet(part) for part in parts], ignore_index=True)
+        # Dictionary encoded columns are loaded as categoricals, convert them back to plain values for groupby
+        return df.astype({c: object for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)})
+    return pd.read_csv(path, sep="|", dtype=dtype, **kwargs)
+
+def temporary_path(path):
+    # Hidden name of a table being rewritten: it does not match the {path}.*.parquet part files
+    return os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+
+def write_table(table, path, columns, records):
+    # Write a whole table to a temporary file replacing path once complete
+    with table(temporary_path(path), columns) as table_t:
+        table_t.write(records)
+    os.replace(temporary_path(path) + table.suffix, path + table.suffix)
+
+def load_interval_table(path, columns):
+    # Struct names are kept as they are, even when they look like numbers or missing values
+    return load_table(path, {name: str if c_type == "string" else "int64" for name, c_type in columns}, keep_default_na=False)
+
+def update_intervals(open_intervals, current, version_idx, last_vidx):
+    # Close the intervals of the items missing from the current version and open the ones of the new items.
+    # open_intervals maps each item to the first vidx of its interval, the closed (item, first_vidx, last_vidx) are returned
+    closed = sorted(key for key in open_intervals if key not in current)
+    intervals = [(key, open_intervals.pop(key), last_vidx) for key in closed]
+    for key in current:
+        if key not in open_intervals:
+            open_intervals[key] = version_idx
+    return intervals
+
+class IntervalTable:
+    # Items (the columns but the last two) valid over intervals of versions [first_vidx, last_vidx]. An interval is
+    # written to path as soon as it ends, the intervals still valid in the last version are rewritten to open_path
+    # at the end of each successful run, and reopened from there by -append
+    def __init__(self, path, open_path, columns, table=CSVTable, append=None):
+        self.open_path = open_path
+        self.columns = columns
+        self.table = table
+        self.open = {} # item -> first_vidx
+        self.last_vidx = -1
+
+        if append is not None:
+            self.last_vidx = append - 1
+            for row in load_interval_table(open_path, columns).itertuples(index=False, name=None):
+                self.open[row[:-2]] = int(row[-2])
+
+        self.table_t = table(path, columns, append)
+
+    def update(self, version_idx, current):
+        # Set of all the items of the next version
+        self.write(update_intervals(self.open, current, version_idx, self.last_vidx))
+        self.last_vidx = version_idx
+
+    def replace(self, version_idx, removed, added):
+        # Items removed and added in the next version, the others are still valid
+        self.write([(key, self.open.pop(key), self.last_vidx) for key in sorted(removed)])
+        for key in added:
+            self.open[key] = version_idx
+        self.last_vidx = version_idx
+
+    def write(self, intervals):
+        self.table_t.write([(*key, first_vidx, last_vidx) for key, first_vidx, last_vidx in intervals])
+
+    def close(self, finalize=True):
+        self.table_t.close()
+        if finalize:
+            write_table(self.table, self.open_path, self.columns, [(*key, first_vidx, self.last_vidx) for key, first_vidx in sorted(self.open.items())])
+
+class GraphStoreWriter:
+    # Temporal store of the pointers and embedded graphs of every version. Nodes and weighted edges are stored
+    # once per validity interval in graph_{nodes,edges}_{os}, and graph_open_{nodes,edges}_{os} for the intervals
+    # still valid in the last version
+    def __init__(self, output_dir, os_name, table=CSVTable, append=None):
+        path = lambda kind: os.path.join(output_dir, f"{kind}_{os_name}")
+        self.nodes_t = IntervalTable(path("graph_nodes"), path("graph_open_nodes"), GRAPH_NODES_COLUMNS, table, append)
+        self.edges_t = IntervalTable(path("graph_edges"), path("graph_open_edges"), GRAPH_EDGES_COLUMNS, table, append)
+
+    def add(self, version_idx, graphs):
+        # Update the intervals with the graphs ({"pointers": ig.Graph, "embedded": ig.Graph}) of the next version
+        nodes = set()
+        edges = set()
+        for g_name, graph in graphs.items():
+            names = graph.vs["name"]
+            nodes.update((g_name, name) for name in names)
+            edges.update((g_name, names[src], names[dst], weight) for (src, dst), weight in zip(graph.get_edgelist(), graph.es["weight"]))
+
+        self.nodes_t.update(version_idx, nodes)
+        self.edges_t.update(version_idx, edges)
+
+    def close(self, finalize=True):
+        self.nodes_t.close(finalize)
+        self.edges_t.close(finalize)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        # The open intervals of a failed run are not written, the ones of the last complete run are kept
+        self.close(exc_type is None)
+
+class ImpactWriter:
+    # Transitive reverse embedding closure of every version: for each struct, the structs embedding it directly or
+    # through other structs, whose size and field offsets can change with it. The (s_name, impacted) pairs are stored
+    # as validity intervals in impact_{os} and impact_open_{os}. From one version to the next only the closures of the
+    # structs whose embedders changed, and of the structs they embed, are recomputed
+    def __init__(self, output_dir, os_name, table=CSVTable, append=None):
+        path = lambda kind: os.path.join(output_dir, f"{kind}_{os_name}")
+        self.pairs_t = IntervalTable(path("impact"), path("impact_open"), IMPACT_COLUMNS, table, append)
+        self.parents = {} # struct -> structs embedding it
+        self.children = {} # struct -> structs embedded in it
+        self.closure = defaultdict(set)
+        for s_name, impacted in self.pairs_t.open:
+            self.closure[s_name].add(impacted)
+
+    @staticmethod
+    def embedding(graph):
+        # Parents and children of each struct in the embedded graph
+        names = graph.vs["name"]
+        parents = defaultdict(set)
+        children = defaultdict(set)
+        for src, dst in graph.get_edgelist():
+            parents[names[dst]].add(names[src])
+            children[names[src]].add(names[dst])
+        return parents, children
+
+    def set_previous(self, graph):
+        # Embedded graph of the last version already written, used by -append
+        self.parents, self.children = self.embedding(graph)
+
+    @staticmethod
+    def descendants(roots, children):
+        seen = set()
+        stack = list(roots)
+        while stack:
+            s_name = stack.pop()
+            if s_name not in seen:
+                seen.add(s_name)
+                stack.extend(children.get(s_name, ()))
+        return seen
+
+    def ancestors(self, s_name, parents, affected):
+        # The closures of the structs outside affected did not change, they are reused instead of walked again
+        seen = set()
+        stack = list(parents.get(s_name, ()))
+        while stack:
+            parent = stack.pop()
+            if parent in seen:
+                continue
+            seen.add(parent)
+            if parent in affected:
+                stack.extend(parents.get(parent, ()))
+            else:
+                seen.update(self.closure.get(parent, ()))
+        return seen
+
+    def add(self, version_idx, graph):
+        # Update the closures with the embedded graph (ig.Graph) of the next version
+        parents, children = self.embedding(graph)
+        changed = [s_name for s_name in parents.keys() | self.parents.keys() if parents.get(s_name) != self.parents.get(s_name)]
+        affected = self.descendants(changed, self.children) | self.descendants(changed, children)
+
+        closure = {s_name: self.ancestors(s_name, parents, affected) for s_name in affected}
+        removed = [(s_name, impacted) for s_name in affected for impacted in self.closure.get(s_name, ()) if impacted not in closure[s_name]]
+        added = [(s_name, impacted) for s_name in affected for impacted in closure[s_name] if impacted not in self.closure.get(s_name, ())]
+        self.pairs_t.replace(version_idx, removed, added)
+
+        for s_name, impacted in closure.items():
+            if impacted:
+                self.closure[s_name] = impacted
+            else:
+                self.closure.pop(s_name, None)
+        self.parents, self.children = parents, children
+
+    def close(self, finalize=True):
+        self.pairs_t.close(finalize)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.close(exc_type is None)
+
+class ImpactIndex:
+    # Reader of the reverse embedding closures written by ImpactWriter
+    def __init__(self, output_dir, os_name):
+        path = lambda kind: os.path.join(output_dir, f"{kind}_{os_name}")
+        pairs = pd.concat([load_interval_table(path("impact"), IMPACT_COLUMNS), load_interval_table(path("impact_open"), IMPACT_COLUMNS)], ignore_index=True)
+        self.pairs = pairs.sort_values(["s_name", "first_vidx"], kind="stable", ignore_index=True)
+        self.s_names = self.pairs["s_name"].to_numpy(dtype=str)
+
+    def impacted(self, s_name, version_idx):
+        # Structs embedding s_name, directly or not, in a version
+        pairs = self.pairs.iloc[np.searchsorted(self.s_names, s_name, side="left"):np.searchsorted(self.s_names, s_name, side="right")]
+        return sorted(pairs.loc[(pairs["first_vidx"] <= version_idx) & (pairs["last_vidx"] >= version_idx), "impacted"])
+
+class GraphStore:
+    # Reader of the temporal graph store written by GraphStoreWriter
+    def __init__(self, output_dir, os_name):
+        path = lambda kind: os.path.join(output_dir, f"{kind}_{os_name}")
+        self.nodes = pd.concat([load_interval_table(path("graph_nodes"), GRAPH_NODES_COLUMNS), load_interval_table(path("graph_open_nodes"), GRAPH_NODES_COLUMNS)], ignore_index=True)
+        self.edges = pd.concat([load_interval_table(path("graph_edges"), GRAPH_EDGES_COLUMNS), load_interval_table(path("graph_open_edges"), GRAPH_EDGES_COLUMNS)], ignore_index=True)
+        self.versions = int(self.nodes["last_vidx"].max()) + 1 if len(self.nodes) else 0
+
+    @staticmethod
+    def valid(table, graph, version_idx):
+        return table[(table["graph"] == graph) & (table["first_vidx"] <= version_idx) & (table["last_vidx"] >= version_idx)]
+
+    def graph(self, graph, version_idx):
+        # Materialize the "pointers" or "embedded" graph of a version
+        edges = self.valid(self.edges, graph, version_idx)
+        g = ig.Graph.TupleList(edges[["src", "dst", "weight"]].itertuples(index=False, name=None), directed=True, weights=True)
+        g.add_vertices(sorted(set(self.valid(self.nodes, graph, version_idx)["name"]).difference(g.vs["name"])))
+        g["version_idx"] = version_idx
+        return g
+
+    def vertex_counts(self, graph):
+        # Number of vertices of the graph in every version, without materializing it
+        nodes = self.nodes[self.nodes["graph"] == graph]
+        counts = np.zeros(self.versions + 1, dtype=np.int64)
+        np.add.at(counts, nodes["first_vidx"].to_numpy(), 1)
+        np.add.at(counts, nodes["last_vidx"].to_numpy() + 1, -1)
+        return np.cumsum(counts[:-1]).tolist()
+
+class SymbolDeltaWriter:
+    # Symbols of every version stored as differences from the previous version. Each version starts
+    # with a "version" row followed by the "added", "removed" and "moved" (new kind or address) symbols.
+    # The first version and one version every keyframe start with a "keyframe" row instead, followed
+    # by all the symbols as "added"
+    def __init__(self, path, table=CSVTable, append=None, keyframe=50):
+        self.table_t = table(path, SYMBOL_DELTAS_COLUMNS, append)
+        self.keyframe = keyframe
+        self.previous = None
+
+    def set_previous(self, records):
+        # Symbols of the last version already written, used by -append
+        self.previous = {s_name: (kind, address) for _, _, _, _, s_name, kind, address in records}
+
+    def add(self, version_idx, major, minor, build, records):
+        # records are the (vidx, major, minor, build, s_name, kind, address) tuples of the version
+        current = {s_name: (kind, address) for _, _, _, _, s_name, kind, address in records}
+
+        if self.previous is None or version_idx % self.keyframe == 0:
+            deltas = [(version_idx, major, minor, build, "keyframe", "", "", 0)]
+            deltas.extend((version_idx, major, minor, build, "added", s_name, kind, address) for s_name, (kind, address) in current.items())
+        else:
+            deltas = [(version_idx, major, minor, build, "version", "", "", 0)]
+            for s_name, (kind, address) in current.items():
+                old = self.previous.get(s_name)
+                if old is None:
+                    deltas.append((version_idx, major, minor, build, "added", s_name, kind, address))
+                elif old != (kind, address):
+                    deltas.append((version_idx, major, minor, build, "moved", s_name, kind, address))
+            for s_name, (kind, address) in self.previous.items():
+                if s_name not in current:
+                    deltas.append((version_idx, major, minor, build, "removed", s_name, kind, address))
+
+        self.table_t.write(deltas)
+        self.previous = current
+
+    def close(self):
+        self.table_t.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class SymbolStore:
+    # Reader of the symbols written by SymbolDeltaWriter
+    def __init__(self, output_dir, os_name):
+        self.deltas = load_table(os.path.join(output_dir, f"symbols_{os_name}"),
+                                 {"major": str, "minor": str, "build": str, "op": str, "s_name": str, "kind": str}, keep_default_na=False)
+        # Parquet stores empty strings as nulls
+        self.deltas = self.deltas.fillna({"major": "", "minor": "", "build": "", "s_name": "", "kind": ""})
+        headers = self.deltas["op"].isin(("version", "keyframe"))
+        self.versions = self.deltas[headers].set_index("vidx")
+        self.keyframes = np.sort(self.deltas.loc[self.deltas["op"] == "keyframe", "vidx"].to_numpy())
+        self.deltas = self.deltas[~headers]
+
+    def symbols(self, version_idx):
+        # Rebuild the symbols table of a version: the last row of each symbol since the previous keyframe wins
+        keyframe = self.keyframes[np.searchsorted(self.keyframes, version_idx, side="right") - 1]
+        window = self.deltas[(self.deltas["vidx"] >= keyframe) & (self.deltas["vidx"] <= version_idx)]
+        window = window.drop_duplicates("s_name", keep="last")
+        window = window[window["op"] != "removed"]
+
+        version = self.versions.loc[version_idx]
+        return pd.DataFrame({
+            "vidx": version_idx,
+            "major": version["major"],
+            "minor": version["minor"],
+            "build": version["build"],
+            "s_name": window["s_name"].to_numpy(),
+            "kind": window["kind"].to_numpy(),
+            "address": window["address"].to_numpy()
+        })
+
+class FieldLifetimeWriter:
+    # Runs of consecutive versions in which a (struct, field) keeps the same offset, kind and base type, written to
+    # field_lifetimes_{os} sorted by struct, field and first_vidx. The closed runs are sorted and spilled to temporary
+    # files every chunk runs, and merged with the runs still open at the end of a successful run. The runs valid in
+    # the last version are the ones ending at its vidx, -append reopens them
+    def __init__(self, path, table=CSVTable, append=None, chunk=FIELD_RUNS_CHUNK):
+        self.path = path
+        self.table = table
+        self.chunk = chunk
+        self.runs = [] # (s_name, f_name, first_vidx, last_vidx, offset, kind, base_type) not spilled yet
+        self.spills = [] # temporary files of sorted runs
+        self.open_runs = {} # (s_name, f_name, offset, kind, base_type) -> first_vidx
+        self.last_vidx = -1
+
+        if append is not None:
+            self.last_vidx = append - 1
+            for row in load_field_runs(path).itertuples(index=False, name=None):
+                s_name, f_name, first_vidx, last_vidx, offset, kind, base_type = row
+                if last_vidx == self.last_vidx:
+                    self.open_runs[(s_name, f_name, offset, kind, base_type)] = first_vidx
+                else:
+                    self.append_run(row)
+
+    @staticmethod
+    def run_key(run):
+        return run[0], run[1], run[2]
+
+    def append_run(self, run):
+        self.runs.append(run)
+        if len(self.runs) >= self.chunk:
+            self.spill()
+
+    def spill(self):
+        self.runs.sort(key=self.run_key)
+        f = tempfile.TemporaryFile(dir=os.path.dirname(self.path) or ".")
+        for start in range(0, len(self.runs), SPILL_BLOCK):
+            pickle.dump(self.runs[start:start + SPILL_BLOCK], f)
+        self.spills.append(f)
+        self.runs = []
+
+    @staticmethod
+    def spilled(f):
+        f.seek(0)
+        while True:
+            try:
+                block = pickle.load(f)
+            except EOFError:
+                return
+            yield from block
+
+    def add(self, version_idx, structs):
+        current = set((s_name, f_name, field.offset, field.kind, field.base_type) for s_name, struct in structs.items() for f_name, field in struct["fields"].items())
+        for (s_name, f_name, offset, kind, base_type), first_vidx, last_vidx in update_intervals(self.open_runs, current, version_idx, self.last_vidx):
+            self.append_run((s_name, f_name, first_vidx, last_vidx, offset, kind, base_type))
+        self.last_vidx = version_idx
+
+    def close(self, finalize=True):
+        if finalize:
+            self.runs.extend((s_name, f_name, first_vidx, self.last_vidx, offset, kind, base_type) for (s_name, f_name, offset, kind, base_type), first_vidx in self.open_runs.items())
+            self.runs.sort(key=self.run_key)
+            runs = heapq.merge(self.runs, *(self.spilled(f) for f in self.spills), key=self.run_key)
+            with self.table(temporary_path(self.path), FIELD_RUNS_COLUMNS) as runs_t:
+                for block in iter(lambda: list(islice(runs, self.chunk)), []):
+                    runs_t.write(block)
+            os.replace(temporary_path(self.path) + self.table.suffix, self.path + self.table.suffix)
+        for f in self.spills:
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        # A failed run leaves the table of the last complete run
+        self.close(exc_type is None)
+
+def load_field_runs(path):
+    runs = load_table(path, {"s_name": str, "f_name": str, "first_vidx": "int64", "last_vidx": "int64", "offset": "int64", "kind": str, "base_type": str}, keep_default_na=False)
+    # Parquet stores empty strings as nulls
+    runs = runs.fillna({"base_type": ""})
+    return runs.astype({"first_vidx": "int64", "last_vidx": "int64", "offset": "int64"})
+
+class FieldLifetimes:
+    # Reader of field_lifetimes_{os}: the table is sorted by (s_name, f_name, first_vidx), lookups are binary searches
+    def __init__(self, output_dir, os_name):
+        self.runs = load_field_runs(os.path.join(output_dir, f"field_lifetimes_{os_name}"))
+        self.s_names = self.runs["s_name"].to_numpy(dtype=str)
+        self.keys = (self.runs["s_name"] + "\x01" + self.runs["f_name"]).to_numpy(dtype=str)
+        self.first_vidx = self.runs["first_vidx"].to_numpy()
+
+    def history(self, s_name, f_name):
+        # All the runs of a field, in version order
+        key = f"{s_name}\x01{f_name}"
+        return self.runs.iloc[np.searchsorted(self.keys, key, side="left"):np.searchsorted(self.keys, key, side="right")]
+
+    def at(self, s_name, f_name, version_idx):
+        # The run of a field valid in a version, None if the field does not exist there
+        key = f"{s_name}\x01{f_name}"
+        start = np.searchsorted(self.keys, key, side="left")
+        end = np.searchsorted(self.keys, key, side="right")
+        idx = start + np.searchsorted(self.first_vidx[start:end], version_idx, side="right") - 1
+        if idx < start or self.runs["last_vidx"].iat[idx] < version_idx:
+            return None
+        return self.runs.iloc[idx]
+
+    def struct_at(self, s_name, version_idx):
+        # The fields of a struct in a version, with their offset, kind and base type
+        runs = self.runs.iloc[np.searchsorted(self.s_names, s_name, side="left"):np.searchsorted(self.s_names, s_name, side="right")]
+        return runs[(runs["first_vidx"] <= version_idx) & (runs["last_vidx"] >= version_idx)]
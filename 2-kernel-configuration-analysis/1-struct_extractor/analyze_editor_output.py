@@ -1,5 +1,12 @@
+import bisect
 import re
 
+COMMENT_RE = re.compile('(\/\*(\*(?!\/)|[^*])*\*\/)|(\/\/[^\n\r]*?(?:\*\)|[\n\r]))')
+# Attributes between struct and its name (__packed, __aligned(8), __attribute__((packed)), ...) are skipped as ctags does
+STRUCT_RE = re.compile(r'\bstruct\s+(?:(?:__attribute__\s*\(\(.*?\)\)|__[a-zA-Z0-9_]+(?:\s*\([^(){};]*\))?)\s+)*([a-zA-Z0-9_]+)\s*{')
+BRACES_RE = re.compile('[{}]')
+DEFINE_RE = re.compile(r'^[ \t]*#[ \t]*define\b(?:[^\n]*\\\n)*[^\n]*', re.MULTILINE)
+
 def filter_out_ignoreable_structs(name, path):
     dirs_to_ignore = ['certs', 'Documentation', 'drivers', 'init', 'lib', 'samples', 'scripts', 'tools', 'usr']
     for dir in dirs_to_ignore.copy():
@@ -26,39 +33,38 @@ def parse_editor_structs(filename, filter_func):
             }
         return map
 
-def extract_struct_by_name(text, name):
-    struct = None
-    text = filter_out_comments(text)
-    match = re.search(f'struct\s+{name}\s+{"{"}', text)
-    if match is None:
-        raise Exception
-    bracket_counter = 1
-    char_counter = 0
-    struct_def = text[match.start():match.end()]
-
-
-    for c in text[match.end():]:
-        char_counter += 1
-        struct_def += c
-        if c == '{':
-            bracket_counter += 1
-        elif c == '}':
-            bracket_counter -= 1
-            if bracket_counter == 0:
-                break
-    text = text[match.end() + char_counter:]
-    return struct_def
-
-
 def filter_out_comments(text):
-    while True:
-        match = re.search('(\/\*(\*(?!\/)|[^*])*\*\/)|(\/\/[^\n\r]*?(?:\*\)|[\n\r]))', text)
-        if match is None:
-            break
-        
-        text = text[:match.start()] + text[match.end():]
+    return COMMENT_RE.sub('', text)
 
-    return text
+def locate_structs(text):
+    # All the struct definitions of a file as name -> definition, with the comments stripped in a single pass.
+    # The first definition of a name is kept, it ends at its matching brace (or at the end of the file).
+    # Macro bodies are not code for ctags: their structs and braces are skipped
+    text = filter_out_comments(text)
+    defines = [(match.start(), match.end()) for match in DEFINE_RE.finditer(text)]
+    define_starts = [start for start, _ in defines]
+
+    def in_define(pos):
+        i = bisect.bisect_right(define_starts, pos) - 1
+        return i >= 0 and pos < defines[i][1]
+
+    closing = {}
+    opened = []
+    for match in BRACES_RE.finditer(text):
+        if in_define(match.start()):
+            continue
+        if match.group() == '{':
+            opened.append(match.start())
+        elif opened:
+            closing[opened.pop()] = match.start()
+
+    structs = {}
+    for match in STRUCT_RE.finditer(text):
+        name = match.group(1)
+        if name not in structs and not in_define(match.start()):
+            end = closing.get(match.end() - 1, len(text) - 1)
+            structs[name] = text[match.start():end + 1]
+    return structs
 
 def extract_struct(text):
     struct = None
@@ -83,11 +89,6 @@ def extract_struct(text):
     return struct
 
 
-def extract_struct_from_file_by_name(filename, struct_name):
-    with open(filename, 'r') as f:
-        text = f.read()
-        return extract_struct_by_name(text, struct_name)
-
 def extract_struct_from_file(filename, line_number):
     with open(filename, 'r') as f:
         for _ in range(line_number - 1):
@@ -1,12 +1,16 @@
 import fileinput
+import hashlib
+import sqlite3
 import subprocess
 import os
 import time
 import argparse
 import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 from tqdm import tqdm
-from analyze_editor_output import parse_editor_structs, extract_struct_from_file_by_name, filter_out_ignoreable_structs
+from analyze_editor_output import parse_editor_structs, filter_out_ignoreable_structs, locate_structs
 
 def relative_to_abs_path(relative_path):
     return os.path.abspath(relative_path)
@@ -19,6 +23,11 @@ LOGS_DIR = os.path.join(OUTPUT_DIR, 'logs')
 LOGS_JSON_DIR =  os.path.join(OUTPUT_DIR, 'logs_json')
 ARCHS = ['x86', 'arm64', 'x86_64']
 TAGS_PATH = './tags.txt'
+STATE_FILE = 'extract_state.json'
+SOURCE_SUFFIXES = ('.c', '.h')
+STRUCT_INDEX_FILE = 'struct_index.json'
+CTAGS_FILTER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ctags_filter')
+STRUCT_CACHE_VERSION = 2 # Bump it every time locate_structs changes to invalidate the cached structs
 # STRUCTS_DIR = relative_to_abs_path("../output/structs")
 # STRUCTS_JSON_DIR = relative_to_abs_path("../structs_json")
 # LOGS_DIR = relative_to_abs_path("../logs")
@@ -48,24 +57,27 @@ def patch_tags_sh():
                 print(line, end='')
                 continue
             print('\t--$CTAGS_EXTRA=+fq --c-kinds=+px --fields=+iaS --langmap=c:+.h --excmd=number \\', end='')
-    except:
+    except FileNotFoundError:
         print('tags.sh not found')
 
 def run_cmd(cmd, version, cwd=''):
-    try:
-        with open(f'{LOGS_DIR}/logs.{version}.txt', 'a') as f:
-            f.write(f'{str(datetime.now())} > {cmd}\n')
-            subprocess.run(cmd, shell = True, executable="/bin/bash", cwd=cwd, stdout=f, stderr=f)
-    except:
-        return
+    # Raises CalledProcessError when the command fails, the stage running it is not recorded as done
+    with open(f'{LOGS_DIR}/logs.{version}.txt', 'a') as f:
+        f.write(f'{str(datetime.now())} > {cmd}\n')
+        f.flush()
+        subprocess.run(cmd, shell = True, executable="/bin/bash", cwd=cwd, stdout=f, stderr=f, check=True)
 
 def get_arch_dirs():
     return next(os.walk(f'{PATH_TO_LINUX}/arch'))[1]
 
-def run_make_tags(version):
+def run_make_tags(version, ctags_files=None):
     print('running make tags')
     archs = [x for x in get_arch_dirs() if x in ARCHS]
-    run_cmd(f'make ALLSOURCE_ARCHS="{" ".join(archs)}" tags', version, PATH_TO_LINUX)
+    env = ''
+    if ctags_files is not None:
+        # ctags_filter/ctags comes first in the PATH and only indexes the files listed in ctags_files
+        env = f'CTAGS_FILES="{ctags_files}" PATH="{CTAGS_FILTER_DIR}:$PATH" '
+    run_cmd(f'{env}make ALLSOURCE_ARCHS="{" ".join(archs)}" tags', version, PATH_TO_LINUX)
 
 def run_readtags(version):
     print('running read tags')
@@ -75,47 +87,353 @@ def extract_from_current_version(version):
     patch_tags_sh()
     run_make_tags(version)
     run_readtags(version)
+    if os.path.getsize(f'{STRUCTS_DIR}/structs.{version}.txt') == 0:
+        raise Exception(f'no struct found by make tags in {version}')
+
+def read_structs_txt(version):
+    # Lines of structs.{version}.txt grouped by file, paths without the leading ./
+    files = {}
+    with open(f'{STRUCTS_DIR}/structs.{version}.txt', 'r') as f:
+        for line in f:
+            if len(line) <= 3:
+                continue
+            path = line.split('\t')[1]
+            files.setdefault(path[2:] if path.startswith('./') else path, []).append(line)
+    return files
+
+def run_ctags_on_files(version, paths):
+    # Struct lines that readtags would list for the given files: make tags runs as for -mt, with the same
+    # scripts/tags.sh options, but ctags only reads these files
+    files_path = f'{STRUCTS_DIR}/files.{version}.tmp'
+    with open(files_path, 'w') as f:
+        f.writelines(f'{path}\n' for path in paths)
+    try:
+        patch_tags_sh()
+        run_make_tags(version, files_path)
+    finally:
+        os.remove(files_path)
+    # No tags file when none of the files is indexed by tags.sh
+    if not os.path.exists(os.path.join(PATH_TO_LINUX, 'tags')):
+        return []
+    output = subprocess.run(['readtags', '-Q', '(eq? $kind "s")', '-t', 'tags', '-l'], capture_output=True, text=True, cwd=PATH_TO_LINUX, check=True).stdout
+    return output.splitlines(keepends=True)
+
+def extract_incremental_tags(version):
+    # Same structs.{version}.txt of make tags, but ctags only runs on the files changed since the last version
+    # done: the struct lines of each file are kept in OUTPUT/struct_index.json. The first version is a full make tags.
+    # The index is only replaced once all the commands of a version succeeded
+    index_path = os.path.join(OUTPUT_DIR, STRUCT_INDEX_FILE)
+    index = None
+    if os.path.exists(index_path):
+        with open(index_path, 'r') as f:
+            index = json.load(f)
+
+    if index is None:
+        extract_from_current_version(version)
+        files = read_structs_txt(version)
+        index = {'version': version, 'files': files}
+    else:
+        output = subprocess.run(['git', 'diff', '--name-only', '--no-renames', '-z', index['version'], version], capture_output=True, check=True, cwd=PATH_TO_LINUX).stdout
+        changed = set(path for path in output.decode('utf-8', errors='replace').split('\0') if path)
+        files = {path: lines for path, lines in index['files'].items() if path not in changed}
+        paths = [path for path in changed if os.path.exists(os.path.join(PATH_TO_LINUX, path))]
+        if paths:
+            for line in run_ctags_on_files(version, paths):
+                path = line.split('\t')[1]
+                path = path[2:] if path.startswith('./') else path
+                # Only the changed files are taken, whatever else the tags file holds
+                if path in changed:
+                    files.setdefault(path, []).append(line)
+
+        # readtags lists the sorted tags file
+        with open(f'{STRUCTS_DIR}/structs.{version}.txt', 'w') as f:
+            f.writelines(sorted(line for lines in files.values() for line in lines))
+        index = {'version': version, 'files': files}
+
+    with open(f'{index_path}.tmp', 'w') as f:
+        json.dump(index, f)
+    os.replace(f'{index_path}.tmp', index_path)
+
+def blob_sha(data):
+    # Object id given by git to a file content
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+def decode_source(data):
+    # Text of a file as read in text mode (universal newlines). Undecodable bytes are replaced, a content
+    # has the same structs whatever the extraction mode
+    return data.decode('utf-8', errors='replace').replace('\r\n', '\n').replace('\r', '\n')
+
+class StructCache:
+    # Structs located in each file content (name -> definition) keyed by git blob sha, so that a content is scanned
+    # once over all the tags. Stored in OUTPUT/struct_cache.v{STRUCT_CACHE_VERSION}.sqlite, kept between runs and
+    # shared by the worker processes
+    def __init__(self):
+        self.db = sqlite3.connect(os.path.join(OUTPUT_DIR, f'struct_cache.v{STRUCT_CACHE_VERSION}.sqlite'), timeout=600, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS structs (sha TEXT PRIMARY KEY, structs TEXT)')
+        self.hits = 0
+        self.misses = 0
+
+    def structs(self, sha, read):
+        row = self.db.execute('SELECT structs FROM structs WHERE sha = ?', (sha,)).fetchone()
+        if row is not None:
+            self.hits += 1
+            return json.loads(row[0])
+        self.misses += 1
+        structs = locate_structs(decode_source(read()))
+        self.db.execute('INSERT OR REPLACE INTO structs VALUES (?, ?)', (sha, json.dumps(structs)))
+        return structs
+
+    def file_structs(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        return self.structs(blob_sha(data), lambda: data)
+
+    def report(self, version):
+        # Print and log the hit rate of a version
+        lookups = self.hits + self.misses
+        message = f'{version}: {self.hits}/{lookups} files from the struct cache ({100 * self.hits / lookups if lookups else 0:.1f}%)'
+        print(message)
+        with open(f'{LOGS_JSON_DIR}/logs.{version}.txt', 'a') as f:
+            f.write(f'{str(datetime.now())} > {message}\n')
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        self.db.close()
 
 def extract_structs_json(version):
     try:
         struct_map = parse_editor_structs(f'{STRUCTS_DIR}/structs.{version}.txt', filter_out_ignoreable_structs)
+        files = {} # Each file is read and scanned once for all its structs
+        cache = StructCache()
         for struct in struct_map.values():
             try:
-                struct['struct_def'] = extract_struct_from_file_by_name(f"{PATH_TO_LINUX}/{struct['path']}", struct['name'])
+                path = f"{PATH_TO_LINUX}/{struct['path']}"
+                if path not in files:
+                    files[path] = cache.file_structs(path)
+                if struct['name'] not in files[path]:
+                    raise Exception(f'struct {struct["name"]} not found')
+                struct['struct_def'] = files[path][struct['name']]
             except Exception as e:
                 print(e)
                 with open(f'{LOGS_JSON_DIR}/logs.{version}.txt', 'a') as f:
                     f.write(f'failed to extract struct: {struct["name"]} from {PATH_TO_LINUX}/{struct["path"]}\n')
                     f.write(f'{str(e)}\n')
+        cache.report(version)
+        cache.close()
         with open(f'{STRUCTS_JSON_DIR}/struct_map.{version}.json', 'w') as f:
             print(f'writing to {f.name}')
             json.dump(struct_map, f, indent=4)
     except Exception as e:
         with open(f'{LOGS_JSON_DIR}/logs.{version}.txt', 'a') as f:
             f.write(f'{str(e)}\n')
+        raise
 
     
 
-def iterate_versions(func):
-    for v in tqdm(read_tags_txt()):
-        start = time.time()
-        run_cmd(f'git checkout {v} --force', v, PATH_TO_LINUX)
-        end = time.time()
-        print(f'checkout to tag {v}, elapsed time: {end-start}s')
+STAGES = {
+    'make_tags': extract_from_current_version,
+    'incremental_tags': extract_incremental_tags,
+    'structs_json': extract_structs_json,
+}
+
+def load_state():
+    # Elapsed time of every stage completed for each tag, written after each tag to resume an interrupted run
+    state_path = os.path.join(OUTPUT_DIR, STATE_FILE)
+    if not os.path.exists(state_path):
+        return {}
+    with open(state_path, 'r') as f:
+        return json.load(f)
+
+def save_state(state):
+    state_path = os.path.join(OUTPUT_DIR, STATE_FILE)
+    with open(f'{state_path}.tmp', 'w') as f:
+        json.dump(state, f, indent=4)
+    os.replace(f'{state_path}.tmp', state_path)
+
+def provision_worktrees(jobs, worktrees_path):
+    # One worktree of the linux repository per worker, kept between runs
+    worktrees = []
+    for i in range(jobs):
+        path = os.path.join(worktrees_path, f'linux.{i}')
+        if not os.path.exists(path):
+            print(f'creating worktree {path}')
+            subprocess.run(['git', 'worktree', 'add', '--detach', path], cwd=PATH_TO_LINUX, check=True)
+        worktrees.append(path)
+    return worktrees
 
+def init_worker(worktrees, output_dir):
+    # Each worker process checks out the tags in its own worktree. The output directories are set again,
+    # the worker does not inherit them when it is spawned instead of forked
+    global PATH_TO_LINUX
+    PATH_TO_LINUX = worktrees.get()
+    set_output_dirs(output_dir)
+
+def extract_version(version, stages):
+    # Elapsed time of the stages completed for a tag, and the error that stopped the others: a failed
+    # stage is not recorded and runs again with the next run
+    timings = {}
+    try:
         start = time.time()
-        func(v)
-        end = time.time()
-        print(f'extracted structs {v}, elapsed time: {end-start}s')
+        run_cmd(f'git checkout {version} --force', version, PATH_TO_LINUX)
+        timings['checkout'] = time.time() - start
+
+        for stage in stages:
+            start = time.time()
+            STAGES[stage](version)
+            timings[stage] = time.time() - start
+            with open(f'{LOGS_DIR}/logs.{version}.txt', 'a') as f:
+                f.write(f'{str(datetime.now())} > {stage} done in {timings[stage]:.1f}s\n')
+    except Exception as e:
+        with open(f'{LOGS_DIR}/logs.{version}.txt', 'a') as f:
+            f.write(f'{str(datetime.now())} > failed: {str(e)}\n')
+        return version, timings, str(e)
+    return version, timings, None
+
+def print_timings(state, tags, elapsed):
+    for stage in ['checkout', *STAGES, 'git_blobs']:
+        timings = [state[v][stage] for v in tags if stage in state.get(v, {})]
+        if timings:
+            print(f'{stage}: {len(timings)} tags, total {sum(timings):.0f}s, mean {sum(timings) / len(timings):.1f}s, max {max(timings):.1f}s')
+    print(f'elapsed time: {elapsed:.0f}s')
+
+def iterate_versions(stages, jobs=1, worktrees_path=None):
+    # Run the stages of every tag not done yet, with more than one job the tags are processed in parallel
+    # in worker processes, each one on its own git worktree
+    tags = read_tags_txt()
+    state = load_state()
+    pending = [(v, [stage for stage in stages if stage not in state.get(v, {})]) for v in tags]
+    pending = [(v, v_stages) for v, v_stages in pending if v_stages]
+    print(f'{len(tags) - len(pending)} tags already extracted, {len(pending)} to go')
+
+    start = time.time()
+    pool = None
+    if jobs <= 1:
+        results = (extract_version(v, v_stages) for v, v_stages in pending)
+    else:
+        worktrees = multiprocessing.Queue()
+        for path in provision_worktrees(jobs, worktrees_path):
+            worktrees.put(path)
+        pool = ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(worktrees, OUTPUT_DIR))
+        results = (future.result() for future in as_completed([pool.submit(extract_version, v, v_stages) for v, v_stages in pending]))
+
+    failed = []
+    try:
+        for version, timings, error in tqdm(results, total=len(pending)):
+            state.setdefault(version, {}).update(timings)
+            save_state(state)
+            if error is not None:
+                print(f'{version} failed: {error}')
+                failed.append(version)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    print_timings(state, tags, time.time() - start)
+    if failed:
+        print(f'{len(failed)} tags failed ({", ".join(failed)}), see their logs and run again to retry them')
+
+def is_tags_source(path):
+    # Files indexed by make tags with ALLSOURCE_ARCHS: C sources and headers outside tools and the other archs
+    # (arch/* and include/asm-* of older kernels)
+    if not path.endswith(SOURCE_SUFFIXES):
+        return False
+    dirs = path.split('/')
+    if dirs[0] == 'tools':
+        return False
+    if dirs[0] == 'arch' and len(dirs) > 2 and dirs[1] not in ARCHS:
+        return False
+    if dirs[0] == 'include' and len(dirs) > 2 and dirs[1].startswith('asm-') and dirs[1][4:] not in [*ARCHS, 'generic']:
+        return False
+    return True
+
+def list_source_blobs(version):
+    # path -> blob sha of the sources of a tag, read from the git objects without checking it out
+    output = subprocess.run(['git', 'ls-tree', '-r', '-z', version], cwd=PATH_TO_LINUX, capture_output=True, check=True).stdout
+    blobs = {}
+    for entry in output.decode('utf-8', errors='replace').split('\0'):
+        if not entry:
+            continue
+        info, path = entry.split('\t', 1)
+        _, kind, sha = info.split()
+        if kind == 'blob' and is_tags_source(path) and filter_out_ignoreable_structs(None, path):
+            blobs[path] = sha
+    return blobs
+
+class BlobReader:
+    # Contents of git blobs read through a single git cat-file --batch process
+    def __init__(self):
+        self.process = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=PATH_TO_LINUX, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def read(self, sha):
+        self.process.stdin.write(f'{sha}\n'.encode())
+        self.process.stdin.flush()
+        size = int(self.process.stdout.readline().split()[2])
+        data = self.process.stdout.read(size)
+        self.process.stdout.read(1) # Newline after the contents
+        return data
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+def extract_structs_from_git():
+    # Write struct_map.{version}.json without checkouts nor make tags: the structs are located directly in the
+    # blobs of each tag. Only the files whose blob changed since the previous tag are read and scanned again,
+    # the structs of the other ones are carried over. When a name is defined in more files the last path wins,
+    # as in the sorted output of readtags
+    tags = read_tags_txt()
+    state = load_state()
+    files = {} # path -> (blob sha, structs of the file)
+    reader = BlobReader()
+    cache = StructCache()
+    try:
+        for v in tqdm(tags):
+            if 'git_blobs' in state.get(v, {}):
+                continue
+
+            start = time.time()
+            blobs = list_source_blobs(v)
+            changed = [path for path, sha in blobs.items() if files.get(path, (None, None))[0] != sha]
+            for path in changed:
+                files[path] = (blobs[path], cache.structs(blobs[path], lambda: reader.read(blobs[path])))
+            for path in [path for path in files if path not in blobs]:
+                del files[path]
+
+            struct_map = {}
+            for path in sorted(blobs):
+                for name, struct_def in files[path][1].items():
+                    struct_map[name] = {
+                        'name': name,
+                        'path': path,
+                        'struct_def': struct_def
+                    }
+            with open(f'{STRUCTS_JSON_DIR}/struct_map.{v}.json', 'w') as f:
+                json.dump({name: struct_map[name] for name in sorted(struct_map)}, f, indent=4)
+
+            state.setdefault(v, {})['git_blobs'] = time.time() - start
+            save_state(state)
+            cache.report(v)
+            with open(f'{LOGS_JSON_DIR}/logs.{v}.txt', 'a') as f:
+                f.write(f'{str(datetime.now())} > {len(changed)}/{len(blobs)} files scanned in {state[v]["git_blobs"]:.1f}s\n')
+    finally:
+        reader.close()
+        cache.close()
+    print_timings(state, tags, sum(state[v].get('git_blobs', 0) for v in tags))
 
 def getArgs():
 
     argParser = argparse.ArgumentParser()
     argParser.add_argument('-mt', '--make_tags', action='store_true')
+    argParser.add_argument('-it', '--incremental_tags', action='store_true')
     argParser.add_argument('-sj', '--structs_json', action='store_true')
     argParser.add_argument('-s', '--sample', action="store_true")
+    argParser.add_argument('-gb', '--git_blobs', action='store_true')
     argParser.add_argument('-l', '--path_to_linux_directory', default=PATH_TO_LINUX)
     argParser.add_argument('-o', '--output_path', default=OUTPUT_DIR)
+    argParser.add_argument('-j', '--jobs', type=int, default=1)
+    argParser.add_argument('-w', '--worktrees_path', default=None)
     
     args = argParser.parse_args()
     
@@ -143,16 +461,28 @@ def main():
     try:
         args = getArgs()
         if args.output_path != OUTPUT_DIR:
-            set_output_dirs(OUTPUT_DIR)
+            set_output_dirs(relative_to_abs_path(args.output_path))
         PATH_TO_LINUX = args.path_to_linux_directory
         make_directories()
         if args.sample:
             global TAGS_PATH
             TAGS_PATH = './sample_tags.txt'
+        stages = []
         if args.make_tags:
-            iterate_versions(extract_from_current_version)
+            stages.append('make_tags')
+        if args.incremental_tags:
+            # Each version starts from the index of the previous one
+            if args.jobs > 1:
+                print('-it processes the tags one after the other, ignoring -j')
+                args.jobs = 1
+            stages.append('incremental_tags')
         if args.structs_json:
-            iterate_versions(extract_structs_json)
+            stages.append('structs_json')
+        worktrees_path = relative_to_abs_path(args.worktrees_path or os.path.join(OUTPUT_DIR, 'worktrees'))
+        if stages:
+            iterate_versions(stages, args.jobs, worktrees_path)
+        if args.git_blobs:
+            extract_structs_from_git()
     except KeyboardInterrupt:
         print("Stopped")
 